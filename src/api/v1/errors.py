@@ -0,0 +1,32 @@
+from fastapi import FastAPI, Request, status
+from fastapi.responses import ORJSONResponse
+
+from services.file_storage_crud import QuotaExceeded, VersionMismatch
+from services.integrity import DigestMismatch, InvalidDigest
+
+# errors any endpoint may raise from the services, with their response
+ERROR_RESPONSES = {
+    InvalidDigest: (status.HTTP_400_BAD_REQUEST, "Invalid digest header"),
+    DigestMismatch: (
+        status.HTTP_400_BAD_REQUEST,
+        "Content does not match the digest",
+    ),
+    QuotaExceeded: (
+        status.HTTP_507_INSUFFICIENT_STORAGE,
+        "Storage quota exceeded",
+    ),
+    VersionMismatch: (
+        status.HTTP_412_PRECONDITION_FAILED,
+        "File version has changed",
+    ),
+}
+
+
+async def error_response(request: Request, exc: Exception) -> ORJSONResponse:
+    status_code, detail = ERROR_RESPONSES[type(exc)]
+    return ORJSONResponse({"detail": detail}, status_code=status_code)
+
+
+def add_error_handlers(app: FastAPI) -> None:
+    for error in ERROR_RESPONSES:
+        app.add_exception_handler(error, error_response)
@@ -1,19 +1,35 @@
+from datetime import datetime, timedelta
 from time import monotonic
-from typing import Annotated, Any
+from typing import Annotated, Any, AsyncIterator
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import FileResponse
+from fastapi import (APIRouter, BackgroundTasks, Depends, File, Form, Header,
+                     HTTPException, Query, Request, Response, UploadFile,
+                     status)
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError, parse_raw_as
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import app_settings
 from db.database import get_session
-from schemas import file_schema, user_schema
+from schemas import change_schema, file_schema, usage_schema, user_schema
 from services.auth import get_current_user
-from services.file_storage_crud import file_crud
+from services.cache import content_cache
+from services.delta import DeltaError, block_signatures, open_base
+from services.file_storage_crud import (InvalidOffset, change_crud, file_crud,
+                                        usage_crud)
+from services.integrity import expected_digests, format_digest
+from services.io_engine import io_engine
+from services.storage import blob_paths, blob_response, read_blob, remove_blobs
+from services.tiering import COLD, access_tracker, tier_store
+from services.volumes import volume_set
 
 file_router = APIRouter()
 
-in_folder = "static/"
+in_folder = app_settings.storage_folder
+
+MIN_BLOCK_SIZE = 1024
+MAX_BLOCK_SIZE = 16 * 1024**2
 
 
 def is_valid_uuid(uuid: str) -> bool:
@@ -24,6 +40,44 @@ def is_valid_uuid(uuid: str) -> bool:
     return str(uuid_obj) == uuid
 
 
+def read_signatures(
+    blob_path: str, compressed: bool, content: bytes | None, block_size: int
+) -> list[file_schema.BlockSignature]:
+    with open_base(blob_path, content, compressed) as base:
+        return block_signatures(base, block_size)
+
+
+def make_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_etag(value: str) -> int | None:
+    value = value.strip().removeprefix("W/").strip('"')
+    return int(value) if value.isdigit() else None
+
+
+def expiry(expires_in: int | None) -> datetime | None:
+    if expires_in is None:
+        return None
+    return datetime.utcnow() + timedelta(seconds=expires_in)
+
+
+def check_bulk_path(path: str) -> None:
+    # an empty or root source would match every file of the user, and an
+    # empty or root destination would make files without a name
+    if not path.strip("/"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A file or folder path is required",
+        )
+
+
+def join_path(folder: str, name: str) -> str:
+    if not folder or folder.endswith("/"):
+        return folder + name
+    return f"{folder}/{name}"
+
+
 @file_router.get(
     "/ping",
     description="Ping db",
@@ -54,6 +108,108 @@ async def get_files_info(
     }
 
 
+@file_router.get(
+    "/search",
+    response_model=file_schema.FilesSearch,
+    description="Search files by name or path.",
+)
+async def search_files(
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    query: Annotated[str, Query(min_length=1)],
+    skip: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+    db: AsyncSession = Depends(get_session),
+):
+    results = await file_crud.search_by_user(
+        db, user_id=current_user.id, query=query, skip=skip, limit=limit
+    )
+    return {
+        "account": current_user.name,
+        "files": [
+            {**file_schema.File.from_orm(file_obj).dict(), "score": score}
+            for file_obj, score in results
+        ],
+    }
+
+
+@file_router.get(
+    "/usage",
+    response_model=usage_schema.Usage,
+    description="Storage usage of the user or of a folder.",
+)
+async def get_usage(
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    path: str = "",
+    db: AsyncSession = Depends(get_session),
+):
+    if path and not path.endswith("/"):
+        path += "/"
+    usage = await usage_crud.get_by_prefix(db, current_user.id, path)
+    return {
+        "account": current_user.name,
+        "path": path,
+        "size": usage.size if usage is not None else 0,
+        "files": usage.files if usage is not None else 0,
+        "quota": await usage_crud.get_quota(db, current_user.id),
+    }
+
+
+@file_router.get(
+    "/changes",
+    response_model=change_schema.ChangesFeed,
+    description="Changes after the cursor, waiting up to `wait` seconds.",
+)
+async def get_changes(
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    since: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    wait: Annotated[float, Query(ge=0)] = 0,
+    db: AsyncSession = Depends(get_session),
+):
+    # do not hold a pooled connection while long-polling
+    await db.close()
+    changes = await change_crud.wait_since(
+        current_user.id,
+        since,
+        limit,
+        min(wait, app_settings.changes_max_wait),
+    )
+    return {
+        "account": current_user.name,
+        "cursor": changes[-1].id if changes else since,
+        "changes": changes,
+    }
+
+
+@file_router.get(
+    "/changes/stream",
+    description="Server-sent events stream of changes after the cursor.",
+)
+async def stream_changes(
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    since: Annotated[int, Query(ge=0)] = 0,
+    last_event_id: Annotated[int | None, Header()] = None,
+    db: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    await db.close()
+
+    async def events() -> AsyncIterator[str]:
+        # reconnecting EventSource clients resume from Last-Event-ID
+        cursor = since if last_event_id is None else last_event_id
+        while True:
+            changes = await change_crud.wait_since(
+                current_user.id, cursor, 100, app_settings.changes_max_wait
+            )
+            if not changes:
+                yield ": keep-alive\n\n"
+            for change in changes:
+                data = change_schema.Change.from_orm(change).json()
+                yield f"id: {change.id}\ndata: {data}\n\n"
+                cursor = change.id
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @file_router.post(
     "/upload",
     response_model=file_schema.File,
@@ -63,17 +219,310 @@ async def get_files_info(
 async def file_upload(
     path: str,
     current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    expires_in: Annotated[int | None, Query(ge=1)] = None,
+    content_digest: Annotated[str | None, Header()] = None,
+    content_md5: Annotated[str | None, Header()] = None,
     db: AsyncSession = Depends(get_session),
     in_file: UploadFile = File(...),
 ):
+    # the digests cover the uploaded file, not the multipart body
     result = await file_crud.assembly_before_creation(
-        db, in_file, path, current_user.id, in_folder
+        db,
+        in_file,
+        path,
+        current_user.id,
+        in_folder,
+        expiry(expires_in),
+        expected_digests(content_digest, content_md5),
+    )
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This value is already exist",
+        )
+    return result
+
+
+@file_router.post(
+    "/upload/batch",
+    response_model=file_schema.FilesBatch,
+    description="Upload many files into a folder in one request.",
+)
+async def file_upload_batch(
+    path: str,
+    request: Request,
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    expires_in: Annotated[int | None, Query(ge=1)] = None,
+    db: AsyncSession = Depends(get_session),
+):
+    form = await request.form(max_files=app_settings.upload_batch_max_files)
+    in_files = [
+        (in_file, join_path(path, in_file.filename))
+        for in_file in form.getlist("in_files")
+        if isinstance(in_file, UploadFile)
+    ]
+    if not in_files:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="No files in the in_files field",
+        )
+    try:
+        results = await file_crud.assembly_batch_before_creation(
+            db, in_files, current_user.id, in_folder, expiry(expires_in)
+        )
+    finally:
+        await form.close()
+    return {
+        "account": current_user.name,
+        "files": [
+            {
+                "path": file_path,
+                "created": file_obj is not None,
+                "file": file_obj,
+            }
+            for file_path, file_obj in results
+        ],
+    }
+
+
+@file_router.post(
+    "/bulk/delete",
+    response_model=file_schema.FilesBulkResult,
+    description="Delete a file or a whole folder.",
+)
+async def bulk_delete(
+    bulk_in: file_schema.FilesBulkDelete,
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_session),
+):
+    check_bulk_path(bulk_in.path)
+    deleted = await file_crud.delete_by_path(db, current_user.id, bulk_in.path)
+    for row in deleted:
+        content_cache.invalidate(row.id)
+    background_tasks.add_task(
+        remove_blobs,
+        [
+            blob_path
+            for row in deleted
+            if row.segment is None
+            for blob_path in blob_paths(row.id, row.volume, in_folder)
+        ],
     )
+    return {"account": current_user.name, "count": len(deleted)}
+
+
+@file_router.post(
+    "/bulk/move",
+    response_model=file_schema.FilesBulkResult,
+    description="Move or rename a file or a whole folder.",
+)
+async def bulk_move(
+    bulk_in: file_schema.FilesBulkMove,
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_session),
+):
+    check_bulk_path(bulk_in.source)
+    check_bulk_path(bulk_in.destination)
+    moved = await file_crud.move_by_path(
+        db, current_user.id, bulk_in.source, bulk_in.destination
+    )
+    if moved is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This value is already exist",
+        )
+    return {"account": current_user.name, "count": len(moved)}
+
+
+@file_router.post(
+    "/bulk/copy",
+    response_model=file_schema.FilesBulkResult,
+    description="Copy a file or a whole folder.",
+)
+async def bulk_copy(
+    bulk_in: file_schema.FilesBulkMove,
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_session),
+):
+    check_bulk_path(bulk_in.source)
+    check_bulk_path(bulk_in.destination)
+    copied = await file_crud.copy_by_path(
+        db,
+        current_user.id,
+        bulk_in.source,
+        bulk_in.destination,
+        in_folder,
+    )
+    if copied is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This value is already exist",
+        )
+    return {"account": current_user.name, "count": len(copied)}
+
+
+@file_router.post(
+    "/upload/precheck",
+    response_model=file_schema.FilePrecheckResult,
+    description="Create the file from already stored content, if any.",
+)
+async def file_upload_precheck(
+    precheck_in: file_schema.FilePrecheck,
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_session),
+):
+    exists, result = await file_crud.create_from_hash(
+        db,
+        precheck_in.path,
+        precheck_in.sha256,
+        precheck_in.size,
+        current_user.id,
+        in_folder,
+        expiry(precheck_in.expires_in),
+    )
+    if not exists:
+        params = {"path": precheck_in.path}
+        if precheck_in.expires_in is not None:
+            params["expires_in"] = precheck_in.expires_in
+        upload_url = request.url_for("file_upload").include_query_params(
+            **params
+        )
+        return {"exists": False, "file": None, "upload_url": str(upload_url)}
     if result is None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="This value is already exist",
         )
+    response.status_code = status.HTTP_201_CREATED
+    return {"exists": True, "file": result, "upload_url": None}
+
+
+@file_router.get(
+    "/signatures",
+    response_model=file_schema.FileSignatures,
+    description="Block signatures of a stored file for delta updates.",
+)
+async def get_signatures(
+    path: str,
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    block_size: Annotated[
+        int, Query(ge=MIN_BLOCK_SIZE, le=MAX_BLOCK_SIZE)
+    ] = app_settings.delta_block_size,
+    db: AsyncSession = Depends(get_session),
+):
+    file_obj = await file_crud.get_id_by_path_and_user(
+        db, path=path, user_id=current_user.id
+    )
+    if file_obj is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    content = None
+    if file_obj.segment is not None:
+        content = await read_blob(file_obj, in_folder)
+    compressed = file_obj.tier == COLD
+    if compressed:
+        blob_path = tier_store.cold_path(file_obj.id)
+    else:
+        blob_path = volume_set.blob_path(
+            file_obj.id, file_obj.volume, in_folder
+        )
+    blocks = await io_engine.run(
+        read_signatures, blob_path, compressed, content, block_size
+    )
+    return {
+        "path": file_obj.path,
+        "version": file_obj.version,
+        "size": file_obj.size,
+        "block_size": block_size,
+        "blocks": blocks,
+    }
+
+
+@file_router.post(
+    "/upload/delta",
+    response_model=file_schema.File,
+    description="Rebuild a stored file from its blocks and new data.",
+)
+async def file_upload_delta(
+    path: str,
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    instructions: Annotated[str, Form()],
+    block_size: Annotated[
+        int, Query(ge=MIN_BLOCK_SIZE, le=MAX_BLOCK_SIZE)
+    ] = app_settings.delta_block_size,
+    version: int | None = None,
+    data: UploadFile | None = File(None),
+    db: AsyncSession = Depends(get_session),
+):
+    try:
+        parsed = parse_raw_as(list[file_schema.DeltaInstruction], instructions)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(),
+        )
+    try:
+        result = await file_crud.apply_delta(
+            db,
+            path,
+            current_user.id,
+            version,
+            parsed,
+            data.file if data is not None else None,
+            block_size,
+            in_folder,
+        )
+    except DeltaError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return result
+
+
+@file_router.patch(
+    "/upload",
+    response_model=file_schema.File,
+    description="Write the request body at an offset or append it.",
+)
+async def file_write(
+    request: Request,
+    response: Response,
+    path: str,
+    current_user: Annotated[user_schema.UserId, Depends(get_current_user)],
+    offset: Annotated[int | None, Query(ge=0)] = None,
+    if_match: Annotated[str | None, Header()] = None,
+    db: AsyncSession = Depends(get_session),
+):
+    version = None
+    if if_match is not None:
+        version = parse_etag(if_match)
+        if version is None:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Invalid If-Match header",
+            )
+    try:
+        result = await file_crud.write_at(
+            db,
+            path,
+            current_user.id,
+            version,
+            offset,
+            request.stream(),
+            in_folder,
+        )
+    except InvalidOffset:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Offset is past the end of the file",
+        )
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    response.headers["ETag"] = make_etag(result.version)
     return result
 
 
@@ -94,6 +543,13 @@ async def file_download(
     if file_obj is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     # return in_folder + str(file_obj.id)
+    await tier_store.promote(db, file_obj)
+    access_tracker.touch(file_obj.id)
 
-    headers = {"Content-Disposition": f"attachment; filename={file_obj.name}"}
-    return FileResponse(in_folder + str(file_obj.id), headers=headers)
+    headers = {
+        "Content-Disposition": f"attachment; filename={file_obj.name}",
+        "ETag": make_etag(file_obj.version),
+    }
+    if file_obj.sha256 is not None:
+        headers["Content-Digest"] = format_digest(file_obj.sha256)
+    return await blob_response(file_obj, in_folder, headers, current_user.id)
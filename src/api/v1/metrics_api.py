@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from core.metrics import MetricValue, metrics
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("", description="Service metrics.")
+async def get_metrics() -> dict[str, MetricValue]:
+    return metrics.collect()
@@ -22,10 +22,93 @@ class AppSettings(BaseSettings):
     project_host: str = "127.0.0.1"
     project_port: int = 8080
 
+    server_workers: int = 0
+    server_backlog: int = 2048
+    server_keep_alive: int = 5
+    server_graceful_timeout: float = 30.0
+
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
 
+    storage_folder: str = "static/"
+    storage_volumes: dict[str, str] = {}
+    storage_volumes_draining: list[str] = []
+    storage_rebalance_interval: float = 600.0
+    storage_rebalance_threshold: float = 0.1
+    storage_rebalance_batch_size: int = 100
+    storage_rebalance_grace: float = 60.0
+    storage_io_threads: int = 16
+    storage_io_buffer_size: int = 1024**2
+    storage_io_fallocate: bool = True
+    storage_io_dontneed_size: int = 64 * 1024**2
+    storage_free_space_ttl: float = 1.0
+    default_user_quota: int = 0
+
+    segment_storage_enabled: bool = False
+    segment_max_blob_size: int = 4096
+    segment_max_size: int = 256 * 1024**2
+    segment_compaction_interval: float = 600.0
+    segment_compaction_ratio: float = 0.5
+    segment_compaction_grace: float = 60.0
+
+    content_cache_enabled: bool = False
+    content_cache_budget: int = 64 * 1024**2
+    content_cache_max_object_size: int = 256 * 1024
+
+    download_rate_limit: int = 0
+    download_user_rate_limit: int = 0
+    download_chunk_size: int = 64 * 1024
+
+    delta_block_size: int = 64 * 1024
+
+    tiering_enabled: bool = False
+    tier_cold_folder: str = "static/cold/"
+    tier_cold_after: float = 30 * 24 * 3600.0
+    tier_interval: float = 3600.0
+    tier_batch_size: int = 500
+    tier_compress_level: int = 6
+    tier_grace: float = 60.0
+    access_flush_interval: float = 30.0
+
+    expiry_interval: float = 60.0
+    expiry_batch_size: int = 500
+
+    scrub_enabled: bool = False
+    scrub_interval: float = 600.0
+    scrub_batch_size: int = 100
+    scrub_rate: int = 8 * 1024**2
+    scrub_reverify_after: float = 30 * 24 * 3600.0
+
+    changes_poll_interval: float = 1.0
+    changes_fallback_interval: float = 30.0
+    changes_max_wait: float = 60.0
+
+    profiling_secret: str = ""
+    profiling_sample_rate: float = 0.0
+    profiling_folder: str = "profiles/"
+    profiling_max_files: int = 100
+
+    group_commit_enabled: bool = False
+    group_commit_window: float = 0.005
+    group_commit_max_batch: int = 256
+
+    upload_max_concurrent: int = 32
+    upload_max_concurrent_per_user: int = 4
+    upload_max_queue: int = 128
+    upload_queue_timeout: float = 30.0
+    upload_max_body_size: int = 1024**3
+    upload_min_free_disk: int = 1024**3
+    upload_retry_after: int = 5
+    upload_batch_max_files: int = 10000
+
+    database_echo: bool = False
+    database_pool_size: int = 10
+    database_max_overflow: int = 10
+    database_pool_recycle: int = 1800
+    # connections all workers together may hold, 0 for no limit
+    database_max_connections: int = 90
+
     db_set: DBSettings = DBSettings()
     database_dsn: PostgresDsn = parse_obj_as(
         PostgresDsn,
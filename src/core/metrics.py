@@ -0,0 +1,17 @@
+from typing import Callable
+
+MetricValue = int | float
+
+
+class Metrics:
+    def __init__(self):
+        self._gauges: dict[str, Callable[[], MetricValue]] = {}
+
+    def register(self, name: str, getter: Callable[[], MetricValue]) -> None:
+        self._gauges[name] = getter
+
+    def collect(self) -> dict[str, MetricValue]:
+        return {name: getter() for name, getter in self._gauges.items()}
+
+
+metrics = Metrics()
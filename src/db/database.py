@@ -1,5 +1,7 @@
+import asyncio
 from sys import modules
 
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
                                     create_async_engine)
 from sqlalchemy.orm import declarative_base
@@ -12,12 +14,49 @@ async def get_session() -> AsyncSession:
         yield session
 
 
+def pool_limits(workers: int) -> tuple[int, int]:
+    pool_size = app_settings.database_pool_size
+    max_overflow = app_settings.database_max_overflow
+    budget = app_settings.database_max_connections
+    if not budget:
+        return pool_size, max_overflow
+    # every worker has its own pool and a change listener connection, so
+    # they split the budget
+    per_worker = budget // workers - 1
+    if per_worker < 1:
+        raise RuntimeError(
+            f"{workers} workers do not fit in {budget} database connections"
+        )
+    pool_size = min(pool_size, per_worker)
+    return pool_size, min(max_overflow, per_worker - pool_size)
+
+
 Base = declarative_base()
 if "pytest" in modules:
     base_dsn = app_settings.database_test_dsn
 else:
     base_dsn = app_settings.database_dsn
+pool_size, max_overflow = pool_limits(max(app_settings.server_workers, 1))
+
+engine = create_async_engine(
+    base_dsn,
+    echo=app_settings.database_echo,
+    future=True,
+    pool_size=pool_size,
+    max_overflow=max_overflow,
+    pool_recycle=app_settings.database_pool_recycle,
+)
+async_session = async_sessionmaker(engine, expire_on_commit=False)
+# the change listener connects with asyncpg directly, outside the pool
+listen_dsn = engine.url.set(drivername="postgresql").render_as_string(
+    hide_password=False
+)
 
 
-engine = create_async_engine(base_dsn, echo=True, future=True)
-async_session = async_sessionmaker(engine, expire_on_commit=False)
+async def warm_up_pool() -> None:
+    async def ping() -> None:
+        async with engine.connect() as connect:
+            await connect.execute(text("SELECT 1"))
+
+    # open the whole pool before the worker starts taking requests
+    await asyncio.gather(*[ping() for _ in range(pool_size)])
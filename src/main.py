@@ -3,7 +3,18 @@ from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 
 from api.v1 import base_api
+from api.v1.errors import add_error_handlers
 from core.config import app_settings
+from db.database import listen_dsn, warm_up_pool
+from services.admission import UploadAdmissionMiddleware
+from services.background import periodic_jobs
+from services.changes import change_notifier
+from services.file_storage_crud import file_crud, file_group_commit
+from services.profiling import ProfilingMiddleware
+from services.scrubber import scrubber
+from services.segments import segment_store
+from services.tiering import access_tracker, tier_store
+from services.volumes import volume_set
 
 app = FastAPI(
     title=app_settings.project_name,
@@ -12,8 +23,64 @@ app = FastAPI(
     default_response_class=ORJSONResponse,
 )
 
+add_error_handlers(app)
+app.add_middleware(UploadAdmissionMiddleware)
+# the hook is not installed at all unless it can be triggered
+if app_settings.profiling_secret or app_settings.profiling_sample_rate:
+    app.add_middleware(ProfilingMiddleware)
 app.include_router(base_api.api_router, prefix="/api/v1")
 
+if app_settings.segment_storage_enabled:
+    periodic_jobs.register(
+        "segment_compaction",
+        app_settings.segment_compaction_interval,
+        segment_store.compact,
+    )
+
+# every worker flushes the access times it has collected itself
+periodic_jobs.register(
+    "access_flush",
+    app_settings.access_flush_interval,
+    access_tracker.flush,
+    exclusive=False,
+)
+if app_settings.tiering_enabled:
+    periodic_jobs.register(
+        "tier_demotion", app_settings.tier_interval, tier_store.demote
+    )
+
+periodic_jobs.register(
+    "expiry_sweep", app_settings.expiry_interval, file_crud.sweep_expired
+)
+
+if app_settings.scrub_enabled:
+    periodic_jobs.register(
+        "integrity_scrub", app_settings.scrub_interval, scrubber.scrub
+    )
+
+if app_settings.storage_volumes:
+    periodic_jobs.register(
+        "volume_rebalance",
+        app_settings.storage_rebalance_interval,
+        volume_set.rebalance,
+    )
+
+
+@app.on_event("startup")
+async def startup() -> None:
+    await warm_up_pool()
+    change_notifier.start(listen_dsn)
+    periodic_jobs.start()
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await file_group_commit.drain()
+    await periodic_jobs.stop()
+    await change_notifier.stop()
+    await periodic_jobs.run_local(access_tracker.flush)
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -8,7 +8,9 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from core.config import app_settings
 from db.database import Base
+from models.change_model import Change  # noqa: F401
 from models.file_model import File  # noqa: F401
+from models.usage_model import Usage  # noqa: F401
 from models.user_model import User  # noqa: F401
 
 config = context.config
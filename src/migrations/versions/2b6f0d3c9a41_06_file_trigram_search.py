@@ -0,0 +1,52 @@
+"""06_file_trigram_search
+
+Revision ID: 2b6f0d3c9a41
+Revises: 157201d90dd2
+Create Date: 2026-10-19 10:12:31.418204
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2b6f0d3c9a41"
+down_revision = "157201d90dd2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # build without locking writes on large catalogs
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_file_name_trgm",
+            "file",
+            ["name"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_file_path_trgm",
+            "file",
+            ["path"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={"path": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            op.f("ix_file_author_id"),
+            "file",
+            ["author_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_file_author_id"), table_name="file")
+    op.drop_index("ix_file_path_trgm", table_name="file")
+    op.drop_index("ix_file_name_trgm", table_name="file")
@@ -0,0 +1,52 @@
+"""07_usage_rollups
+
+Revision ID: 9e4a7c21d5b8
+Revises: 2b6f0d3c9a41
+Create Date: 2026-10-19 11:04:52.905311
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9e4a7c21d5b8"
+down_revision = "2b6f0d3c9a41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "usage",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("prefix", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("files", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "prefix"),
+    )
+    op.add_column("user", sa.Column("quota", sa.BigInteger(), nullable=True))
+    # the whole-account total is stored under the empty prefix, every
+    # folder prefix of a path (up to and including "/") gets its own row
+    op.execute(
+        """
+        INSERT INTO usage (user_id, prefix, size, files)
+        SELECT author_id, prefix, sum(size), count(*)
+        FROM (
+            SELECT author_id, size, '' AS prefix
+            FROM file
+            UNION ALL
+            SELECT file.author_id, file.size, substr(file.path, 1, pos)
+            FROM file
+            CROSS JOIN LATERAL generate_series(1, length(file.path)) AS pos
+            WHERE substr(file.path, pos, 1) = '/'
+        ) AS prefixes
+        WHERE author_id IS NOT NULL
+        GROUP BY author_id, prefix
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("user", "quota")
+    op.drop_table("usage")
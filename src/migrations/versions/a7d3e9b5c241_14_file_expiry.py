@@ -0,0 +1,35 @@
+"""14_file_expiry
+
+Revision ID: a7d3e9b5c241
+Revises: f2c6d8a4b197
+Create Date: 2026-10-19 18:52:13.607248
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a7d3e9b5c241"
+down_revision = "f2c6d8a4b197"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "file", sa.Column("expires_at", sa.DateTime(), nullable=True)
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_file_expires_at",
+            "file",
+            ["expires_at"],
+            unique=False,
+            postgresql_where=sa.text("expires_at IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_file_expires_at", table_name="file")
+    op.drop_column("file", "expires_at")
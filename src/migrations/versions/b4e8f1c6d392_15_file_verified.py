@@ -0,0 +1,34 @@
+"""15_file_verified
+
+Revision ID: b4e8f1c6d392
+Revises: a7d3e9b5c241
+Create Date: 2026-10-19 20:31:42.175603
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b4e8f1c6d392"
+down_revision = "a7d3e9b5c241"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "file", sa.Column("verified_at", sa.DateTime(), nullable=True)
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_file_verified_at",
+            "file",
+            [sa.text("verified_at NULLS FIRST")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_file_verified_at", table_name="file")
+    op.drop_column("file", "verified_at")
@@ -0,0 +1,34 @@
+"""10_file_sha256
+
+Revision ID: c3f9a1e7b460
+Revises: a17e5b9c3d22
+Create Date: 2026-10-19 14:37:12.810466
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3f9a1e7b460"
+down_revision = "a17e5b9c3d22"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "file", sa.Column("sha256", sa.String(length=64), nullable=True)
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f("ix_file_sha256"),
+            "file",
+            ["sha256"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_file_sha256"), table_name="file")
+    op.drop_column("file", "sha256")
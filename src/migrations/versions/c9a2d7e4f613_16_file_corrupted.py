@@ -0,0 +1,35 @@
+"""16_file_corrupted
+
+Revision ID: c9a2d7e4f613
+Revises: b4e8f1c6d392
+Create Date: 2026-10-20 10:14:27.530918
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c9a2d7e4f613"
+down_revision = "b4e8f1c6d392"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "file", sa.Column("corrupted_at", sa.DateTime(), nullable=True)
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_file_corrupted_at",
+            "file",
+            ["corrupted_at"],
+            unique=False,
+            postgresql_where=sa.text("corrupted_at IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_file_corrupted_at", table_name="file")
+    op.drop_column("file", "corrupted_at")
@@ -0,0 +1,40 @@
+"""11_file_version
+
+Revision ID: d8b2c4f6e913
+Revises: c3f9a1e7b460
+Create Date: 2026-10-19 15:52:40.337109
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d8b2c4f6e913"
+down_revision = "c3f9a1e7b460"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "file",
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+    )
+    op.alter_column(
+        "file",
+        "size",
+        existing_type=sa.Integer(),
+        type_=sa.BigInteger(),
+        existing_nullable=False,
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        "file",
+        "size",
+        existing_type=sa.BigInteger(),
+        type_=sa.Integer(),
+        existing_nullable=False,
+    )
+    op.drop_column("file", "version")
@@ -0,0 +1,40 @@
+"""12_file_tiering
+
+Revision ID: e5a1f7c93b28
+Revises: d8b2c4f6e913
+Create Date: 2026-10-19 16:41:05.218734
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5a1f7c93b28"
+down_revision = "d8b2c4f6e913"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "file", sa.Column("accessed_at", sa.DateTime(), nullable=True)
+    )
+    op.add_column(
+        "file",
+        sa.Column("tier", sa.String(), server_default="hot", nullable=False),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_file_hot_accessed",
+            "file",
+            [sa.text("coalesce(accessed_at, created_ad)")],
+            unique=False,
+            postgresql_where=sa.text("tier = 'hot' AND segment IS NULL"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_file_hot_accessed", table_name="file")
+    op.drop_column("file", "tier")
+    op.drop_column("file", "accessed_at")
@@ -0,0 +1,32 @@
+"""13_file_volume
+
+Revision ID: f2c6d8a4b197
+Revises: e5a1f7c93b28
+Create Date: 2026-10-19 17:26:48.904512
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f2c6d8a4b197"
+down_revision = "e5a1f7c93b28"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("file", sa.Column("volume", sa.String(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f("ix_file_volume"),
+            "file",
+            ["volume"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_file_volume"), table_name="file")
+    op.drop_column("file", "volume")
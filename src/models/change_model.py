@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from sqlalchemy import (BigInteger, Column, DateTime, ForeignKey, Index,
+                        Integer, String)
+from sqlalchemy.dialects.postgresql import UUID
+
+from db.database import Base
+
+
+class Change(Base):
+    __tablename__ = "change"
+    __table_args__ = (Index("ix_change_user_id_id", "user_id", "id"),)
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(
+        Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    file_id = Column(UUID(as_uuid=True), nullable=False)
+    action = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    old_path = Column(String, nullable=True)
+    size = Column(BigInteger, nullable=True)
+    created_ad = Column(DateTime, default=datetime.utcnow)
@@ -1,22 +1,67 @@
 from datetime import datetime
 from uuid import uuid4
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (BigInteger, Column, DateTime, ForeignKey, Index,
+                        Integer, String, text)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
 from db.database import Base
 
+HOT = "hot"
+COLD = "cold"
+
 
 class File(Base):
     __tablename__ = "file"
+    __table_args__ = (
+        Index(
+            "ix_file_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_file_path_trgm",
+            "path",
+            postgresql_using="gin",
+            postgresql_ops={"path": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_file_hot_accessed",
+            text("coalesce(accessed_at, created_ad)"),
+            postgresql_where=text("tier = 'hot' AND segment IS NULL"),
+        ),
+        Index(
+            "ix_file_expires_at",
+            "expires_at",
+            postgresql_where=text("expires_at IS NOT NULL"),
+        ),
+        # never verified files come first for the scrubber
+        Index("ix_file_verified_at", text("verified_at NULLS FIRST")),
+        Index(
+            "ix_file_corrupted_at",
+            "corrupted_at",
+            postgresql_where=text("corrupted_at IS NOT NULL"),
+        ),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     name = Column(String, nullable=False)
     created_ad = Column(DateTime, index=True, default=datetime.utcnow)
     path = Column(String, unique=True, nullable=False)
-    size = Column(Integer, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    segment = Column(String, nullable=True, index=True)
+    segment_offset = Column(BigInteger, nullable=True)
+    sha256 = Column(String(64), nullable=True, index=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    accessed_at = Column(DateTime, nullable=True)
+    tier = Column(String, nullable=False, default=HOT, server_default=HOT)
+    volume = Column(String, nullable=True, index=True)
+    expires_at = Column(DateTime, nullable=True)
+    verified_at = Column(DateTime, nullable=True)
+    corrupted_at = Column(DateTime, nullable=True)
     # is_downloadable = Column(Boolean, default=False)
-    author_id = Column(Integer, ForeignKey("user.id"))
+    author_id = Column(Integer, ForeignKey("user.id"), index=True)
     author = relationship(
         "User",
         cascade="all, delete",
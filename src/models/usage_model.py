@@ -0,0 +1,13 @@
+from sqlalchemy import BigInteger, Column, ForeignKey, Integer, String
+
+from db.database import Base
+
+
+class Usage(Base):
+    __tablename__ = "usage"
+    user_id = Column(
+        Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    prefix = Column(String, primary_key=True, default="")
+    size = Column(BigInteger, nullable=False, default=0)
+    files = Column(Integer, nullable=False, default=0)
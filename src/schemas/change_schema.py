@@ -0,0 +1,23 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class Change(BaseModel):
+    id: int
+    file_id: UUID
+    action: str
+    path: str
+    old_path: str | None
+    size: int | None
+    created_ad: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class ChangesFeed(BaseModel):
+    account: str
+    cursor: int
+    changes: list[Change]
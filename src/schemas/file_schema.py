@@ -1,7 +1,7 @@
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, root_validator
 
 
 class FileBase(BaseModel):
@@ -22,6 +22,9 @@ class FileInDb(FileBase):
     created_ad: datetime
     path: str
     size: int
+    sha256: str | None
+    version: int
+    expires_at: datetime | None
 
     class Config:
         orm_mode = True
@@ -34,3 +37,82 @@ class File(FileInDb):
 class FilesUser(BaseModel):
     account: str
     files: list[File]
+
+
+class FileSearch(File):
+    score: float
+
+
+class FilesSearch(BaseModel):
+    account: str
+    files: list[FileSearch]
+
+
+class FileBatchResult(BaseModel):
+    path: str
+    created: bool
+    file: File | None
+
+
+class FilesBatch(BaseModel):
+    account: str
+    files: list[FileBatchResult]
+
+
+class FilesBulkDelete(BaseModel):
+    path: str
+
+
+class FilesBulkMove(BaseModel):
+    source: str
+    destination: str
+
+
+class FilesBulkResult(BaseModel):
+    account: str
+    count: int
+
+
+class FilePrecheck(FileBase):
+    sha256: str = Field(regex="^[0-9a-f]{64}$")
+    size: int = Field(ge=0)
+    expires_in: int | None = Field(None, ge=1)
+
+
+class FilePrecheckResult(BaseModel):
+    exists: bool
+    file: File | None
+    upload_url: str | None
+
+
+class BlockSignature(BaseModel):
+    index: int
+    weak: int
+    strong: str
+
+
+class FileSignatures(BaseModel):
+    path: str
+    version: int
+    size: int
+    block_size: int
+    blocks: list[BlockSignature]
+
+
+class DeltaInstruction(BaseModel):
+    block: int | None = Field(None, ge=0)
+    count: int = Field(1, ge=1)
+    offset: int | None = Field(None, ge=0)
+    length: int | None = Field(None, ge=0)
+
+    @root_validator
+    @classmethod
+    def check_kind(cls, values):
+        is_copy = values.get("block") is not None
+        is_data = (
+            values.get("offset") is not None
+            and values.get("length") is not None
+        )
+        if is_copy == is_data:
+            raise ValueError("Either block or offset and length is required")
+        return values
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class UsageBase(BaseModel):
+    path: str
+    size: int
+    files: int
+
+
+class Usage(UsageBase):
+    account: str
+    quota: int | None
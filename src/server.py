@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import os
+from types import FrameType
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from core.config import app_settings
+from db.database import pool_limits
+from services.admission import upload_admission
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def worker_count() -> int:
+    if app_settings.server_workers > 0:
+        return app_settings.server_workers
+    # the affinity mask honours cpusets, cpu_count does not
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class DrainingServer(uvicorn.Server):
+    def handle_exit(self, sig: int, frame: FrameType | None) -> None:
+        if not self.should_exit:
+            # in-flight requests, uploads included, get a bounded time to
+            # finish before the worker stops waiting for them
+            logger.info(
+                "Draining %d uploads for up to %.0f seconds",
+                upload_admission.active,
+                app_settings.server_graceful_timeout,
+            )
+            asyncio.get_event_loop().call_later(
+                app_settings.server_graceful_timeout, self._force_exit
+            )
+        super().handle_exit(sig, frame)
+
+    def _force_exit(self) -> None:
+        logger.warning("Graceful shutdown timed out")
+        self.force_exit = True
+
+
+def main() -> None:
+    workers = worker_count()
+    # fail before spawning if the pools can not fit, and let the workers
+    # size their pools for the real worker count
+    pool_limits(workers)
+    os.environ["SERVER_WORKERS"] = str(workers)
+    config = uvicorn.Config(
+        "main:app",
+        host=app_settings.project_host,
+        port=app_settings.project_port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        backlog=app_settings.server_backlog,
+        timeout_keep_alive=app_settings.server_keep_alive,
+        proxy_headers=True,
+    )
+    server = DrainingServer(config)
+    if config.workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from jose import JWTError, jwt
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import app_settings
+from core.metrics import metrics
+from services.volumes import volume_set
+
+UPLOAD_PATH = "/files/upload"
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+
+
+class UploadAdmission:
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_per_user: int,
+        max_queue: int,
+        queue_timeout: float,
+    ):
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._max_per_user = max_per_user
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self._per_user: Counter[str] = Counter()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _reject(self, status_code: int, detail: str) -> UploadRejected:
+        self.rejected += 1
+        return UploadRejected(status_code, detail)
+
+    @asynccontextmanager
+    async def admit(self, user: str | None) -> AsyncIterator[None]:
+        if user is not None and self._per_user[user] >= self._max_per_user:
+            raise self._reject(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "Too many concurrent uploads for this user",
+            )
+        if self._slots.locked() and self.waiting >= self._max_queue:
+            raise self._reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE, "Upload queue is full"
+            )
+        self._per_user[user] += 1
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(
+                self._slots.acquire(), timeout=self._queue_timeout
+            )
+        except asyncio.TimeoutError:
+            self._release_user(user)
+            raise self._reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE, "Upload queue timeout"
+            )
+        except BaseException:
+            # a client that gives up while queued frees its per-user slot
+            self._release_user(user)
+            raise
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+            self._release_user(user)
+
+    def _release_user(self, user: str | None) -> None:
+        self._per_user[user] -= 1
+        if self._per_user[user] <= 0:
+            del self._per_user[user]
+
+
+upload_admission = UploadAdmission(
+    max_concurrent=app_settings.upload_max_concurrent,
+    max_per_user=app_settings.upload_max_concurrent_per_user,
+    max_queue=app_settings.upload_max_queue,
+    queue_timeout=app_settings.upload_queue_timeout,
+)
+metrics.register("upload_active", lambda: upload_admission.active)
+metrics.register("upload_queue_depth", lambda: upload_admission.waiting)
+metrics.register("upload_rejected_total", lambda: upload_admission.rejected)
+
+
+def get_header(scope: Scope, name: bytes) -> str | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def get_token_user(scope: Scope) -> str | None:
+    authorization = get_header(scope, b"authorization")
+    if authorization is None:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    try:
+        payload = jwt.decode(
+            token, app_settings.secret_key, algorithms=[app_settings.algorithm]
+        )
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
+def check_body_size(scope: Scope) -> None:
+    content_length = get_header(scope, b"content-length")
+    if content_length is None:
+        return
+    if int(content_length) > app_settings.upload_max_body_size:
+        raise UploadRejected(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "Request body too large"
+        )
+
+
+async def check_free_disk() -> None:
+    try:
+        free = await volume_set.max_free_space()
+    except OSError:
+        raise UploadRejected(
+            status.HTTP_503_SERVICE_UNAVAILABLE, "Storage is unavailable"
+        )
+    if free < app_settings.upload_min_free_disk:
+        raise UploadRejected(
+            status.HTTP_503_SERVICE_UNAVAILABLE, "Not enough free disk space"
+        )
+
+
+def limit_receive(receive: Receive, max_size: int) -> Receive:
+    received = 0
+
+    async def wrapper() -> Message:
+        nonlocal received
+        message = await receive()
+        received += len(message.get("body", b""))
+        if received > max_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Request body too large",
+            )
+        return message
+
+    return wrapper
+
+
+class UploadAdmissionMiddleware:
+    def __init__(self, app: ASGIApp, admission: UploadAdmission | None = None):
+        self.app = app
+        self.admission = admission or upload_admission
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "GET"
+            or UPLOAD_PATH not in scope["path"]
+        ):
+            await self.app(scope, receive, send)
+            return
+        try:
+            check_body_size(scope)
+            await check_free_disk()
+            async with self.admission.admit(get_token_user(scope)):
+                await self.app(
+                    scope,
+                    limit_receive(receive, app_settings.upload_max_body_size),
+                    send,
+                )
+        except UploadRejected as e:
+            headers = {}
+            if e.status_code != status.HTTP_413_REQUEST_ENTITY_TOO_LARGE:
+                headers["Retry-After"] = str(app_settings.upload_retry_after)
+            response = ORJSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers=headers,
+            )
+            await response(scope, receive, send)
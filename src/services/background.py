@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import zlib
+from typing import Awaitable, Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.database import async_session, engine
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[AsyncSession], Awaitable[None]]
+
+
+class PeriodicJobs:
+    def __init__(self):
+        self._jobs: list[tuple[str, float, Job, bool]] = []
+        self._tasks: list[asyncio.Task] = []
+
+    def register(
+        self, name: str, interval: float, job: Job, exclusive: bool = True
+    ) -> None:
+        self._jobs.append((name, interval, job, exclusive))
+
+    async def run_local(self, job: Job) -> None:
+        async with async_session() as db:
+            await job(db)
+
+    async def run_once(self, name: str, job: Job) -> None:
+        # one worker across all processes runs a job at a time
+        lock_key = zlib.crc32(name.encode())
+        async with engine.connect() as lock_conn:
+            locked = await lock_conn.scalar(
+                select(func.pg_try_advisory_lock(lock_key))
+            )
+            if not locked:
+                return
+            try:
+                await self.run_local(job)
+            finally:
+                await lock_conn.scalar(
+                    select(func.pg_advisory_unlock(lock_key))
+                )
+
+    async def _run(
+        self, name: str, interval: float, job: Job, exclusive: bool
+    ) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if exclusive:
+                    await self.run_once(name, job)
+                else:
+                    await self.run_local(job)
+            except Exception:
+                logger.exception("Periodic job %s failed", name)
+
+    def start(self) -> None:
+        for name, interval, job, exclusive in self._jobs:
+            self._tasks.append(
+                asyncio.create_task(self._run(name, interval, job, exclusive))
+            )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+periodic_jobs = PeriodicJobs()
@@ -1,9 +1,7 @@
 from abc import ABC
 from typing import Any, Generic, Type, TypeVar
 
-from aiofiles import open
 from asyncpg.exceptions import UniqueViolationError
-from fastapi import UploadFile
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from sqlalchemy import delete, select, update
@@ -17,6 +15,10 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+def is_unique_violation(error: IntegrityError) -> bool:
+    return error.orig.__cause__.__class__ == UniqueViolationError
+
+
 class Repository(ABC):
     def get(self, *args, **kwargs):
         raise NotImplementedError
@@ -48,28 +50,6 @@ class RepositoryDB(
             return False
         return True
 
-    async def assembly_before_creation(
-        self,
-        db: AsyncSession,
-        in_file: UploadFile,
-        path: str,
-        author_id: int,
-        in_folder: str,
-    ) -> ModelType | None:
-        file_obj_in = {
-            "name": in_file.filename,
-            "path": path,
-            "size": in_file.size,
-            "author_id": author_id,
-        }
-        result = await self.create(db, obj_in=file_obj_in)
-        if result is None:
-            return None
-        async with open(in_folder + str(result.id), "wb") as out_file:
-            while content := await in_file.read(1024):
-                await out_file.write(content)
-        return result
-
     async def get(self, db: AsyncSession, id: int | str) -> ModelType | None:
         statement = select(self._model).where(self._model.id == id)
         results = await db.execute(statement=statement)
@@ -123,7 +103,7 @@ class RepositoryDB(
         try:
             await db.commit()
         except IntegrityError as e:
-            if e.orig.__cause__.__class__ == UniqueViolationError:
+            if is_unique_violation(e):
                 return None
         await db.refresh(db_obj)
         return db_obj
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from uuid import UUID
+
+from core.config import app_settings
+from core.metrics import metrics
+
+
+class ContentCache:
+    def __init__(self, budget: int, max_object_size: int):
+        self.budget = budget
+        self.max_object_size = max_object_size
+        self._entries: OrderedDict[UUID, tuple[int, bytes]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def accepts(self, size: int) -> bool:
+        return app_settings.content_cache_enabled and (
+            size <= self.max_object_size
+        )
+
+    def get(self, file_id: UUID, version: int) -> bytes | None:
+        entry = self._entries.get(file_id)
+        # entries cached by another version are stale
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(file_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, file_id: UUID, version: int, content: bytes) -> None:
+        if len(content) > self.max_object_size:
+            return
+        self.invalidate(file_id)
+        self._entries[file_id] = (version, content)
+        self.size += len(content)
+        while self.size > self.budget:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def invalidate(self, file_id: UUID) -> None:
+        entry = self._entries.pop(file_id, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+
+content_cache = ContentCache(
+    budget=app_settings.content_cache_budget,
+    max_object_size=app_settings.content_cache_max_object_size,
+)
+metrics.register("content_cache_hits_total", lambda: content_cache.hits)
+metrics.register("content_cache_misses_total", lambda: content_cache.misses)
+metrics.register("content_cache_hit_ratio", lambda: content_cache.hit_ratio)
+metrics.register("content_cache_bytes", lambda: content_cache.size)
+metrics.register("content_cache_entries", lambda: len(content_cache))
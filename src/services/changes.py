@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Iterable
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# every write transaction sends the user id of each change on this channel
+CHANGES_CHANNEL = "file_changes"
+LISTEN_RETRY_DELAY = 5.0
+
+
+class ChangeNotifier:
+    def __init__(self):
+        self._events: dict[int, asyncio.Event] = {}
+        self._task: asyncio.Task | None = None
+        self.listening = False
+
+    def listen(self, user_id: int) -> asyncio.Event:
+        return self._events.setdefault(user_id, asyncio.Event())
+
+    def notify(self, user_ids: Iterable[int]) -> None:
+        for user_id in set(user_ids):
+            event = self._events.pop(user_id, None)
+            if event is not None:
+                event.set()
+
+    def notify_all(self) -> None:
+        self.notify(list(self._events))
+
+    def _on_notification(
+        self, connection: asyncpg.Connection, pid: int, channel: str, payload
+    ) -> None:
+        self.notify([int(payload)])
+
+    async def _listen_once(self, dsn: str) -> None:
+        connection = await asyncpg.connect(dsn)
+        closed = asyncio.Event()
+        connection.add_termination_listener(lambda _: closed.set())
+        try:
+            await connection.add_listener(
+                CHANGES_CHANNEL, self._on_notification
+            )
+            self.listening = True
+            # changes made while nobody listened are picked up by a query
+            self.notify_all()
+            await closed.wait()
+        finally:
+            self.listening = False
+            await connection.close()
+
+    async def _listen(self, dsn: str) -> None:
+        while True:
+            try:
+                await self._listen_once(dsn)
+            except Exception:
+                logger.exception("Change listener connection failed")
+            await asyncio.sleep(LISTEN_RETRY_DELAY)
+
+    def start(self, dsn: str) -> None:
+        self._task = asyncio.create_task(self._listen(dsn))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+change_notifier = ChangeNotifier()
@@ -0,0 +1,78 @@
+import gzip
+import io
+import os
+import zlib
+from hashlib import blake2b, sha256
+from typing import BinaryIO
+
+from schemas.file_schema import BlockSignature, DeltaInstruction
+from services.io_engine import io_engine
+
+
+class DeltaError(ValueError):
+    pass
+
+
+def open_base(
+    blob_path: str | None, content: bytes | None, compressed: bool = False
+) -> BinaryIO:
+    if content is not None:
+        return io.BytesIO(content)
+    if compressed:
+        return gzip.open(blob_path, "rb")
+    return open(blob_path, "rb")
+
+
+def block_signatures(base: BinaryIO, block_size: int) -> list[BlockSignature]:
+    blocks = []
+    while block := base.read(block_size):
+        blocks.append(
+            BlockSignature(
+                index=len(blocks),
+                weak=zlib.adler32(block),
+                strong=blake2b(block, digest_size=16).hexdigest(),
+            )
+        )
+    return blocks
+
+
+def _copy(source: BinaryIO, out_file: BinaryIO, length: int, digest) -> int:
+    copied = 0
+    while copied < length:
+        chunk = source.read(min(io_engine.buffer_size, length - copied))
+        if not chunk:
+            break
+        digest.update(chunk)
+        out_file.write(chunk)
+        copied += len(chunk)
+    return copied
+
+
+def apply_delta(
+    base: BinaryIO,
+    data: BinaryIO | None,
+    instructions: list[DeltaInstruction],
+    block_size: int,
+    out_path: str,
+) -> tuple[int, str]:
+    digest = sha256()
+    size = 0
+    with open(out_path, "wb") as out_file:
+        for instruction in instructions:
+            if instruction.block is not None:
+                base.seek(instruction.block * block_size)
+                length = instruction.count * block_size
+                copied = _copy(base, out_file, length, digest)
+                if copied == 0:
+                    raise DeltaError(f"Block {instruction.block} is missing")
+            else:
+                if data is None:
+                    raise DeltaError("Literal data is missing")
+                data.seek(instruction.offset)
+                copied = _copy(data, out_file, instruction.length, digest)
+                if copied != instruction.length:
+                    raise DeltaError("Literal data is too short")
+            size += copied
+        out_file.flush()
+        os.fsync(out_file.fileno())
+    return size, digest.hexdigest()
@@ -1,17 +1,1032 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from time import monotonic
+from typing import AsyncIterator, BinaryIO, Iterable, NamedTuple
+from uuid import UUID, uuid4
+
+from fastapi import UploadFile
+from sqlalchemy import (ARRAY, Integer, Text, case, cast, delete, func,
+                        literal, or_, select, update)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from core.metrics import metrics
+from db.database import async_session
+from models.change_model import Change as ChangeModel
 from models.file_model import File as FileModel
+from models.usage_model import Usage as UsageModel
 from models.user_model import User as UserModel
-from schemas.file_schema import FileCreate, FileUpdate
+from schemas.change_schema import Change
+from schemas.file_schema import DeltaInstruction, FileCreate, FileUpdate
+from schemas.usage_schema import UsageBase
 from schemas.user_schema import UserCreate, UserUpdate
-from services.base_services import RepositoryDB
+from services.base_services import RepositoryDB, is_unique_violation
+from services.cache import content_cache
+from services.changes import CHANGES_CHANNEL, change_notifier
+from services.delta import apply_delta, open_base
+from services.group_commit import GroupCommit
+from services.integrity import expected_digests
+from services.io_engine import io_engine
+from services.storage import (backup_blob, blob_paths, copy_stored_blob,
+                              is_shared_blob, link_stored_blob, read_blob,
+                              remove_blob, remove_blobs, replace_blob,
+                              share_blob, spool_blob, store_blob,
+                              truncate_blob, write_spool_at)
+from services.tiering import COLD, HOT, tier_store
+from services.volumes import volume_set
 
+LIKE_ESCAPE = "!"
+# asyncpg caps a statement at 32767 bind parameters
+INSERT_CHUNK_SIZE = 1000
 
-class RepositoryFile(RepositoryDB[FileModel, FileCreate, FileUpdate]):
+UsageDeltas = dict[tuple[int, str], list[int]]
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class VersionMismatch(Exception):
     pass
 
 
+class InvalidOffset(Exception):
+    pass
+
+
+def escape_like(value: str) -> str:
+    for char in (LIKE_ESCAPE, "%", "_"):
+        value = value.replace(char, LIKE_ESCAPE + char)
+    return value
+
+
+def folder_prefixes(path: str) -> list[str]:
+    return [""] + [path[: i + 1] for i, char in enumerate(path) if char == "/"]
+
+
+def upload_digests(
+    in_file: UploadFile, digests: dict[str, str] | None
+) -> dict[str, str]:
+    # each part of a multipart body may carry its own digest headers
+    return {
+        **expected_digests(
+            in_file.headers.get("content-digest"),
+            in_file.headers.get("content-md5"),
+        ),
+        **(digests or {}),
+    }
+
+
+class FileEntry(NamedTuple):
+    author_id: int
+    path: str
+    size: int
+
+
+def usage_deltas(
+    files: Iterable[FileModel | FileEntry],
+    sign: int = 1,
+    deltas: UsageDeltas | None = None,
+) -> UsageDeltas:
+    if deltas is None:
+        deltas = defaultdict(lambda: [0, 0])
+    for file_obj in files:
+        for prefix in folder_prefixes(file_obj.path):
+            delta = deltas[file_obj.author_id, prefix]
+            delta[0] += sign * file_obj.size
+            delta[1] += sign
+    return deltas
+
+
+class RepositoryFile(RepositoryDB[FileModel, FileCreate, FileUpdate]):
+    def __init__(self, model: type[FileModel]):
+        super().__init__(model)
+        self.swept = 0
+
+    def _is_live(self):
+        return self._model.expires_at.is_(None) | (
+            self._model.expires_at > func.timezone("utc", func.now())
+        )
+
+    def _is_expired(self):
+        # a range over the partial index on expires_at
+        return self._model.expires_at <= func.timezone("utc", func.now())
+
+    async def get_files_by_user(
+        self, db: AsyncSession, user_id: int
+    ) -> list[FileModel]:
+        statement = select(self._model).where(
+            (self._model.author_id == user_id) & self._is_live()
+        )
+        results = await db.execute(statement=statement)
+        return results.scalars().all()
+
+    async def get_id_by_id_and_user(
+        self, db: AsyncSession, id: str, user_id: int
+    ) -> FileModel | None:
+        statement = select(self._model).where(
+            (self._model.id == id)
+            & (self._model.author_id == user_id)
+            & self._is_live()
+        )
+        results = await db.execute(statement=statement)
+        return results.scalar_one_or_none()
+
+    async def get_id_by_path_and_user(
+        self, db: AsyncSession, path: str, user_id: int
+    ) -> FileModel | None:
+        statement = select(self._model).where(
+            (self._model.path == path)
+            & (self._model.author_id == user_id)
+            & self._is_live()
+        )
+        results = await db.execute(statement=statement)
+        return results.scalar_one_or_none()
+
+    async def assembly_before_creation(
+        self,
+        db: AsyncSession,
+        in_file: UploadFile,
+        path: str,
+        author_id: int,
+        in_folder: str,
+        expires_at: datetime | None = None,
+        digests: dict[str, str] | None = None,
+    ) -> FileModel | None:
+        results = await self.assembly_batch_before_creation(
+            db, [(in_file, path)], author_id, in_folder, expires_at, digests
+        )
+        return results[0][1]
+
+    async def assembly_batch_before_creation(
+        self,
+        db: AsyncSession,
+        in_files: list[tuple[UploadFile, str]],
+        author_id: int,
+        in_folder: str,
+        expires_at: datetime | None = None,
+        digests: dict[str, str] | None = None,
+    ) -> list[tuple[str, FileModel | None]]:
+        await usage_crud.check_quota(
+            db, author_id, sum(in_file.size for in_file, _ in in_files)
+        )
+        values = [
+            {
+                "id": uuid4(),
+                "name": in_file.filename,
+                "path": path,
+                "size": in_file.size,
+                "author_id": author_id,
+                "expires_at": expires_at,
+            }
+            for in_file, path in in_files
+        ]
+        created = {}
+        # a row handed to the group commit may still be written when the
+        # request is cancelled, so its blob has to stay
+        handed_off = False
+        try:
+            for (in_file, _), value in zip(in_files, values):
+                value["volume"] = await volume_set.choose()
+                blob_path = volume_set.blob_path(
+                    value["id"], value["volume"], in_folder
+                )
+                value.update(
+                    await store_blob(
+                        in_file, blob_path, upload_digests(in_file, digests)
+                    )
+                )
+            if app_settings.group_commit_enabled and len(values) == 1:
+                await db.rollback()
+                handed_off = True
+                file_obj = await file_group_commit.submit(values[0])
+                handed_off = False
+                if file_obj is not None:
+                    created = {file_obj.id: file_obj}
+            else:
+                created = await self.create_many(db, values)
+                await usage_crud.check_quota(db, author_id)
+                await db.commit()
+                change_notifier.notify([author_id] if created else [])
+        except Exception:
+            await db.rollback()
+            created = {}
+            handed_off = False
+            raise
+        finally:
+            for value in values:
+                if handed_off or value["id"] in created:
+                    continue
+                if not value.get("segment"):
+                    await remove_blob(
+                        volume_set.blob_path(
+                            value["id"], value.get("volume"), in_folder
+                        )
+                    )
+        return [(value["path"], created.get(value["id"])) for value in values]
+
+    async def commit_batch(
+        self, values: list[dict]
+    ) -> dict[UUID, FileModel | QuotaExceeded]:
+        # rows of many requests share one INSERT and one WAL flush
+        async with async_session() as db:
+            try:
+                created = await self.create_many(db, values)
+                author_ids = sorted({value["author_id"] for value in values})
+                for author_id in author_ids:
+                    await usage_crud.check_quota(db, author_id)
+                await db.commit()
+            except QuotaExceeded:
+                await db.rollback()
+                return await self._commit_each(db, values)
+            except Exception:
+                await db.rollback()
+                raise
+        change_notifier.notify(
+            file_obj.author_id for file_obj in created.values()
+        )
+        return created
+
+    async def _commit_each(
+        self, db: AsyncSession, values: list[dict]
+    ) -> dict[UUID, FileModel | QuotaExceeded]:
+        results = {}
+        for value in values:
+            try:
+                created = await self.create_many(db, [value])
+                await usage_crud.check_quota(db, value["author_id"])
+                await db.commit()
+            except QuotaExceeded as e:
+                await db.rollback()
+                results[value["id"]] = e
+                continue
+            change_notifier.notify([value["author_id"]] if created else [])
+            results.update(created)
+        return results
+
+    async def create_many(
+        self, db: AsyncSession, values: list[dict]
+    ) -> dict[UUID, FileModel]:
+        created = {}
+        for start in range(0, len(values), INSERT_CHUNK_SIZE):
+            end = start + INSERT_CHUNK_SIZE
+            chunk = values[start:end]
+            inserted = await self._insert(db, chunk)
+            missing = [value for value in chunk if value["id"] not in inserted]
+            # paths may still be held by expired rows the sweeper has not
+            # reached yet, they are purged and the insert is retried
+            if missing:
+                purged = await self.purge_expired(
+                    db,
+                    self._model.path.in_([value["path"] for value in missing]),
+                )
+                # expired rows can not be read anymore, so their blobs may
+                # go before this transaction commits
+                if purged:
+                    await self.remove_file_blobs(purged)
+                    inserted.update(await self._insert(db, missing))
+            created.update(inserted)
+        await usage_crud.apply(db, usage_deltas(created.values()))
+        await change_crud.record(db, "created", created.values())
+        return created
+
+    async def _insert(
+        self, db: AsyncSession, values: list[dict]
+    ) -> dict[UUID, FileModel]:
+        statement = (
+            insert(self._model)
+            .values(values)
+            .on_conflict_do_nothing()
+            .returning(self._model)
+        )
+        results = await db.scalars(statement)
+        return {db_obj.id: db_obj for db_obj in results}
+
+    async def purge_expired(self, db: AsyncSession, condition) -> list[Row]:
+        statement = (
+            delete(self._model)
+            .where(condition & self._is_expired())
+            .returning(
+                self._model.id,
+                self._model.author_id,
+                self._model.path,
+                self._model.size,
+                self._model.segment,
+                self._model.volume,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        purged = (await db.execute(statement=statement)).all()
+        await usage_crud.apply(db, usage_deltas(purged, sign=-1))
+        await change_crud.record(db, "deleted", purged)
+        return purged
+
+    async def remove_file_blobs(self, rows: Iterable[Row]) -> None:
+        for row in rows:
+            content_cache.invalidate(row.id)
+            if row.segment is None:
+                await remove_blobs(
+                    blob_paths(row.id, row.volume, app_settings.storage_folder)
+                )
+
+    async def sweep_expired(self, db: AsyncSession) -> None:
+        batch_size = app_settings.expiry_batch_size
+        while True:
+            # rows locked by writers are left for the next batch or run
+            expired = (
+                select(self._model.id)
+                .where(self._is_expired())
+                .order_by(self._model.expires_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            swept = await self.purge_expired(
+                db, self._model.id.in_(expired.scalar_subquery())
+            )
+            await db.commit()
+            self.swept += len(swept)
+            change_notifier.notify(row.author_id for row in swept)
+            await self.remove_file_blobs(swept)
+            if len(swept) < batch_size:
+                return
+
+    async def create_from_hash(
+        self,
+        db: AsyncSession,
+        path: str,
+        sha256: str,
+        size: int,
+        author_id: int,
+        in_folder: str,
+        expires_at: datetime | None = None,
+    ) -> tuple[bool, FileModel | None]:
+        # content is only shared between files of the same user, so the
+        # precheck can not be used to probe for someone else's files
+        statement = (
+            select(self._model)
+            .where(
+                (self._model.author_id == author_id)
+                & (self._model.sha256 == sha256)
+                & (self._model.size == size)
+                & self._is_live()
+            )
+            .limit(1)
+            # writers in place wait until the new hardlink is visible
+            .with_for_update(read=True)
+        )
+        source = (await db.execute(statement=statement)).scalar()
+        if source is None:
+            return False, None
+        await usage_crud.check_quota(db, author_id, size)
+        value = {
+            "id": uuid4(),
+            "name": path.rpartition("/")[2],
+            "path": path,
+            "size": size,
+            "author_id": author_id,
+            "segment": source.segment,
+            "segment_offset": source.segment_offset,
+            "sha256": sha256,
+            "tier": source.tier,
+            "volume": source.volume,
+            "expires_at": expires_at,
+        }
+        created = {}
+        try:
+            await share_blob(source, value["id"], in_folder)
+            created = await self.create_many(db, [value])
+            await usage_crud.check_quota(db, author_id)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            created = {}
+            raise
+        finally:
+            if not created and source.segment is None:
+                await remove_blobs(
+                    blob_paths(value["id"], value["volume"], in_folder)
+                )
+        if created:
+            change_notifier.notify([author_id])
+        return True, created.get(value["id"])
+
+    async def get_for_update(
+        self, db: AsyncSession, path: str, user_id: int
+    ) -> FileModel | None:
+        statement = (
+            select(self._model)
+            .where(
+                (self._model.path == path)
+                & (self._model.author_id == user_id)
+                & self._is_live()
+            )
+            .with_for_update()
+            # a row loaded earlier in the session is refreshed under the lock
+            .execution_options(populate_existing=True)
+        )
+        results = await db.execute(statement=statement)
+        return results.scalar_one_or_none()
+
+    async def get_versioned(
+        self,
+        db: AsyncSession,
+        path: str,
+        user_id: int,
+        version: int | None,
+    ) -> FileModel | None:
+        # the row lock keeps concurrent writers of the same file out
+        db_obj = await self.get_for_update(db, path, user_id)
+        if db_obj is None:
+            await db.rollback()
+            return None
+        if version is not None and version != db_obj.version:
+            await db.rollback()
+            raise VersionMismatch
+        return db_obj
+
+    async def record_update(
+        self,
+        db: AsyncSession,
+        db_obj: FileModel,
+        size: int,
+        sha256: str | None,
+    ) -> None:
+        old_file = FileEntry(db_obj.author_id, db_obj.path, db_obj.size)
+        await usage_crud.check_quota(db, db_obj.author_id, size - db_obj.size)
+        db_obj.size = size
+        db_obj.sha256 = sha256
+        # changed content is verified again, which also fills in a
+        # missing checksum
+        db_obj.verified_at = None
+        db_obj.corrupted_at = None
+        db_obj.segment = None
+        db_obj.segment_offset = None
+        db_obj.tier = HOT
+        db_obj.version += 1
+        deltas = usage_deltas([old_file], sign=-1)
+        await usage_crud.apply(db, usage_deltas([db_obj], deltas=deltas))
+        await change_crud.record(db, "updated", [db_obj])
+        await db.flush()
+
+    async def commit_replacing(
+        self, db: AsyncSession, tmp_path: str, blob_path: str
+    ) -> None:
+        # the old blob is kept until the commit, so a failed commit puts
+        # it back under the unchanged row
+        backup_path = await backup_blob(blob_path)
+        try:
+            # readers holding the old blob open keep reading the old inode
+            await replace_blob(tmp_path, blob_path)
+            await db.commit()
+        except BaseException:
+            if backup_path is not None:
+                await replace_blob(backup_path, blob_path)
+            else:
+                await remove_blob(blob_path)
+            raise
+        finally:
+            if backup_path is not None:
+                await remove_blob(backup_path)
+
+    async def finish_update(self, db_obj: FileModel, was_cold: bool) -> None:
+        if was_cold:
+            await tier_store.remove(db_obj.id)
+        content_cache.invalidate(db_obj.id)
+        change_notifier.notify([db_obj.author_id])
+
+    async def apply_delta(
+        self,
+        db: AsyncSession,
+        path: str,
+        author_id: int,
+        version: int | None,
+        instructions: list[DeltaInstruction],
+        data: BinaryIO | None,
+        block_size: int,
+        in_folder: str,
+    ) -> FileModel | None:
+        db_obj = await self.get_versioned(db, path, author_id, version)
+        if db_obj is None:
+            return None
+        content = None
+        if db_obj.segment is not None:
+            content = await read_blob(db_obj, in_folder)
+        blob_path = volume_set.blob_path(db_obj.id, db_obj.volume, in_folder)
+        tmp_path = f"{blob_path}.{uuid4().hex}.tmp"
+        # cold blobs are read in place and come back to the hot tier
+        was_cold = db_obj.tier == COLD
+        base_path = tier_store.cold_path(db_obj.id) if was_cold else blob_path
+        try:
+            size, digest = await io_engine.run(
+                self._build_delta,
+                base_path,
+                was_cold,
+                content,
+                data,
+                instructions,
+                block_size,
+                tmp_path,
+            )
+            await self.record_update(db, db_obj, size, digest)
+            await self.commit_replacing(db, tmp_path, blob_path)
+        except BaseException:
+            await db.rollback()
+            await remove_blob(tmp_path)
+            content_cache.invalidate(db_obj.id)
+            raise
+        await self.finish_update(db_obj, was_cold)
+        return db_obj
+
+    @staticmethod
+    def _build_delta(
+        blob_path: str,
+        compressed: bool,
+        content: bytes | None,
+        data: BinaryIO | None,
+        instructions: list[DeltaInstruction],
+        block_size: int,
+        out_path: str,
+    ) -> tuple[int, str]:
+        with open_base(blob_path, content, compressed) as base:
+            return apply_delta(base, data, instructions, block_size, out_path)
+
+    async def write_at(
+        self,
+        db: AsyncSession,
+        path: str,
+        author_id: int,
+        version: int | None,
+        offset: int | None,
+        chunks: AsyncIterator[bytes],
+        in_folder: str,
+    ) -> FileModel | None:
+        db_obj = await self.get_id_by_path_and_user(db, path, author_id)
+        # the body is spooled with no transaction open, so a slow client
+        # holds neither the row lock nor a pooled connection
+        await db.commit()
+        if db_obj is None:
+            return None
+        if version is not None and version != db_obj.version:
+            raise VersionMismatch
+        blob_path = volume_set.blob_path(db_obj.id, db_obj.volume, in_folder)
+        spool_path = f"{blob_path}.{uuid4().hex}.tmp"
+        try:
+            written = await spool_blob(spool_path, chunks)
+            return await self._write_spooled(
+                db,
+                path,
+                author_id,
+                version,
+                offset,
+                spool_path,
+                written,
+                in_folder,
+            )
+        finally:
+            await remove_blob(spool_path)
+
+    async def _write_spooled(
+        self,
+        db: AsyncSession,
+        path: str,
+        author_id: int,
+        version: int | None,
+        offset: int | None,
+        spool_path: str,
+        written: int,
+        in_folder: str,
+    ) -> FileModel | None:
+        db_obj = await self.get_versioned(db, path, author_id, version)
+        if db_obj is None:
+            return None
+        old_size = db_obj.size
+        if offset is None:
+            offset = old_size
+        if offset > old_size:
+            await db.rollback()
+            raise InvalidOffset
+        was_cold = db_obj.tier == COLD
+        blob_path = volume_set.blob_path(db_obj.id, db_obj.volume, in_folder)
+        # appends to a private hot blob go in place, anything else is
+        # written to a private copy that replaces the blob on success
+        in_place = (
+            offset == old_size
+            and db_obj.segment is None
+            and not was_cold
+            and not await io_engine.run(is_shared_blob, blob_path)
+        )
+        target_path = blob_path
+        if not in_place:
+            target_path = f"{blob_path}.{uuid4().hex}.tmp"
+        try:
+            if not in_place:
+                await copy_stored_blob(db_obj, in_folder, target_path)
+            await write_spool_at(target_path, offset, spool_path, written)
+            size = max(old_size, offset + written)
+            await self.record_update(db, db_obj, size, None)
+            if in_place:
+                await db.commit()
+            else:
+                await self.commit_replacing(db, target_path, blob_path)
+        except BaseException:
+            # a cancelled or uncommitted append must not leave bytes past
+            # the old size
+            await db.rollback()
+            if in_place:
+                await truncate_blob(blob_path, old_size)
+            else:
+                await remove_blob(target_path)
+            content_cache.invalidate(db_obj.id)
+            raise
+        await self.finish_update(db_obj, was_cold)
+        return db_obj
+
+    def _filter_by_path(self, user_id: int, path: str):
+        folder = path.rstrip("/")
+        return (
+            (self._model.author_id == user_id)
+            & (
+                (self._model.path == folder)
+                | self._model.path.like(
+                    escape_like(folder) + "/%", escape=LIKE_ESCAPE
+                )
+            )
+            & self._is_live()
+        )
+
+    def _moved_columns(self, source: str, destination: str) -> dict:
+        source = source.rstrip("/")
+        destination = destination.rstrip("/")
+        return {
+            "path": literal(destination)
+            + func.substr(self._model.path, len(source) + 1),
+            "name": case(
+                (
+                    self._model.path == source,
+                    destination.rpartition("/")[2],
+                ),
+                else_=self._model.name,
+            ),
+        }
+
+    async def delete_by_path(
+        self, db: AsyncSession, user_id: int, path: str
+    ) -> list[Row]:
+        statement = (
+            delete(self._model)
+            .where(self._filter_by_path(user_id, path))
+            .returning(
+                self._model.id,
+                self._model.author_id,
+                self._model.path,
+                self._model.size,
+                self._model.segment,
+                self._model.volume,
+            )
+        )
+        deleted = (await db.execute(statement=statement)).all()
+        await usage_crud.apply(db, usage_deltas(deleted, sign=-1))
+        await change_crud.record(db, "deleted", deleted)
+        await db.commit()
+        change_notifier.notify(row.author_id for row in deleted)
+        return deleted
+
+    async def move_by_path(
+        self, db: AsyncSession, user_id: int, source: str, destination: str
+    ) -> list[Row] | None:
+        statement = (
+            update(self._model)
+            .where(self._filter_by_path(user_id, source))
+            .values(**self._moved_columns(source, destination))
+            .returning(
+                self._model.id,
+                self._model.author_id,
+                self._model.path,
+                self._model.size,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            moved = (await db.execute(statement=statement)).all()
+        except IntegrityError as e:
+            await db.rollback()
+            if is_unique_violation(e):
+                return None
+            raise
+        source = source.rstrip("/")
+        prefix_length = len(destination.rstrip("/"))
+        old_files = [
+            FileEntry(
+                row.author_id, source + row.path[prefix_length:], row.size
+            )
+            for row in moved
+        ]
+        deltas = usage_deltas(old_files, sign=-1)
+        await usage_crud.apply(db, usage_deltas(moved, deltas=deltas))
+        await change_crud.record(
+            db, "moved", moved, [old_file.path for old_file in old_files]
+        )
+        await db.commit()
+        change_notifier.notify(row.author_id for row in moved)
+        return moved
+
+    async def copy_by_path(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        source: str,
+        destination: str,
+        in_folder: str,
+    ) -> list[Row] | None:
+        moved_columns = self._moved_columns(source, destination)
+        source_files = (
+            select(
+                self._model.id.label("source_id"),
+                func.gen_random_uuid().label("id"),
+                moved_columns["name"].label("name"),
+                moved_columns["path"].label("path"),
+                self._model.size,
+                self._model.author_id,
+                self._model.segment,
+                self._model.segment_offset,
+                self._model.sha256,
+                self._model.tier,
+                self._model.volume,
+                self._model.expires_at,
+            )
+            .where(self._filter_by_path(user_id, source))
+            .with_for_update(read=True)
+            .cte("source_files")
+        )
+        inserted = (
+            insert(self._model)
+            .from_select(
+                [
+                    "id",
+                    "name",
+                    "path",
+                    "size",
+                    "author_id",
+                    "segment",
+                    "segment_offset",
+                    "sha256",
+                    "tier",
+                    "volume",
+                    "expires_at",
+                    "created_ad",
+                ],
+                select(
+                    source_files.c.id,
+                    source_files.c.name,
+                    source_files.c.path,
+                    source_files.c.size,
+                    source_files.c.author_id,
+                    source_files.c.segment,
+                    source_files.c.segment_offset,
+                    source_files.c.sha256,
+                    source_files.c.tier,
+                    source_files.c.volume,
+                    source_files.c.expires_at,
+                    func.timezone("utc", func.now()),
+                ),
+            )
+            .returning(self._model.id)
+            .cte("inserted")
+        )
+        statement = select(
+            source_files.c.source_id,
+            source_files.c.id,
+            source_files.c.author_id,
+            source_files.c.path,
+            source_files.c.size,
+            source_files.c.segment,
+            source_files.c.tier,
+            source_files.c.volume,
+        ).join(inserted, inserted.c.id == source_files.c.id)
+        copied = []
+        try:
+            copied = (await db.execute(statement=statement)).all()
+            # segment entries are immutable and can be shared by copies
+            for row in copied:
+                if row.segment is not None:
+                    continue
+                await link_stored_blob(
+                    row.source_id, row.id, row.tier, row.volume, in_folder
+                )
+            await usage_crud.apply(db, usage_deltas(copied))
+            await usage_crud.check_quota(db, user_id)
+            await change_crud.record(db, "created", copied)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            for row in copied:
+                if row.segment is None:
+                    await remove_blobs(
+                        blob_paths(row.id, row.volume, in_folder)
+                    )
+            if isinstance(e, IntegrityError) and is_unique_violation(e):
+                return None
+            raise
+        change_notifier.notify(row.author_id for row in copied)
+        return copied
+
+    async def search_by_user(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        query: str,
+        *,
+        skip: int = 0,
+        limit: int = 50,
+    ) -> list[tuple[FileModel, float]]:
+        pattern = f"%{escape_like(query)}%"
+        score = func.greatest(
+            func.similarity(self._model.name, query),
+            func.similarity(self._model.path, query),
+        ).label("score")
+        statement = (
+            select(self._model, score)
+            .where(
+                self._model.author_id == user_id,
+                self._is_live(),
+                or_(
+                    self._model.name.ilike(pattern, escape=LIKE_ESCAPE),
+                    self._model.path.ilike(pattern, escape=LIKE_ESCAPE),
+                    self._model.name.op("%")(query),
+                    self._model.path.op("%")(query),
+                ),
+            )
+            .order_by(score.desc(), self._model.path)
+            .offset(skip)
+            .limit(limit)
+        )
+        results = await db.execute(statement=statement)
+        return results.all()
+
+    async def delete(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: FileModel,
+    ) -> None:
+        statement = delete(self._model).where(self._model.id == db_obj.id)
+        await db.execute(statement=statement)
+        await usage_crud.apply(db, usage_deltas([db_obj], sign=-1))
+        await change_crud.record(db, "deleted", [db_obj])
+        await db.commit()
+        change_notifier.notify([db_obj.author_id])
+
+
 class RepositoryUser(RepositoryDB[UserModel, UserCreate, UserUpdate]):
     pass
 
 
+class RepositoryUsage(RepositoryDB[UsageModel, UsageBase, UsageBase]):
+    async def apply(self, db: AsyncSession, deltas: UsageDeltas) -> None:
+        if not deltas:
+            return
+        # sorted keys keep row lock order stable between transactions
+        values = [
+            {
+                "user_id": user_id,
+                "prefix": prefix,
+                "size": size,
+                "files": files,
+            }
+            for (user_id, prefix), (size, files) in sorted(deltas.items())
+        ]
+        statement = insert(self._model).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[self._model.user_id, self._model.prefix],
+            set_={
+                "size": self._model.size + statement.excluded.size,
+                "files": self._model.files + statement.excluded.files,
+            },
+        )
+        await db.execute(statement=statement)
+
+    async def get_by_prefix(
+        self, db: AsyncSession, user_id: int, prefix: str
+    ) -> UsageModel | None:
+        statement = select(self._model).where(
+            (self._model.user_id == user_id) & (self._model.prefix == prefix)
+        )
+        results = await db.execute(statement=statement)
+        return results.scalar_one_or_none()
+
+    async def get_quota(self, db: AsyncSession, user_id: int) -> int | None:
+        quota = await db.scalar(
+            select(UserModel.quota).where(UserModel.id == user_id)
+        )
+        if quota is None:
+            quota = app_settings.default_user_quota
+        return quota or None
+
+    async def check_quota(
+        self, db: AsyncSession, user_id: int, extra: int = 0
+    ) -> None:
+        quota = await self.get_quota(db, user_id)
+        if quota is None:
+            return
+        used = await db.scalar(
+            select(self._model.size).where(
+                (self._model.user_id == user_id) & (self._model.prefix == "")
+            )
+        )
+        if (used or 0) + extra > quota:
+            raise QuotaExceeded
+
+
+class RepositoryChange(RepositoryDB[ChangeModel, Change, Change]):
+    async def record(
+        self,
+        db: AsyncSession,
+        action: str,
+        files: Iterable[FileModel | Row],
+        old_paths: list[str] | None = None,
+    ) -> None:
+        # written after the usage upsert, which holds the lock on the
+        # user's total row, so a user's change ids follow commit order
+        values = [
+            {
+                "user_id": file_obj.author_id,
+                "file_id": file_obj.id,
+                "action": action,
+                "path": file_obj.path,
+                "old_path": old_paths[i] if old_paths else None,
+                "size": file_obj.size,
+            }
+            for i, file_obj in enumerate(files)
+        ]
+        for start in range(0, len(values), INSERT_CHUNK_SIZE):
+            end = start + INSERT_CHUNK_SIZE
+            await db.execute(insert(self._model).values(values[start:end]))
+        if not values:
+            return
+        # delivered on commit to the listeners of every worker
+        user_ids = func.unnest(
+            cast(
+                literal(sorted({value["user_id"] for value in values})),
+                ARRAY(Integer),
+            )
+        ).table_valued("user_id")
+        await db.execute(
+            select(
+                func.pg_notify(CHANGES_CHANNEL, cast(user_ids.c.user_id, Text))
+            )
+        )
+
+    async def get_since(
+        self, db: AsyncSession, user_id: int, since: int, limit: int
+    ) -> list[ChangeModel]:
+        statement = (
+            select(self._model)
+            .where((self._model.user_id == user_id) & (self._model.id > since))
+            .order_by(self._model.id)
+            .limit(limit)
+        )
+        results = await db.execute(statement=statement)
+        return results.scalars().all()
+
+    async def wait_since(
+        self, user_id: int, since: int, limit: int, timeout: float
+    ) -> list[ChangeModel]:
+        deadline = monotonic() + timeout
+        while True:
+            event = change_notifier.listen(user_id)
+            async with async_session() as db:
+                changes = await self.get_since(db, user_id, since, limit)
+            remaining = deadline - monotonic()
+            if changes or remaining <= 0:
+                return changes
+            # the query is repeated only as a fallback for lost
+            # notifications, or often while the listener is down
+            if change_notifier.listening:
+                interval = app_settings.changes_fallback_interval
+            else:
+                interval = app_settings.changes_poll_interval
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, interval))
+            except asyncio.TimeoutError:
+                pass
+
+
 file_crud = RepositoryFile(FileModel)
 user_crud = RepositoryUser(UserModel)
+usage_crud = RepositoryUsage(UsageModel)
+change_crud = RepositoryChange(ChangeModel)
+file_group_commit = GroupCommit(
+    file_crud.commit_batch,
+    key="id",
+    window=app_settings.group_commit_window,
+    max_batch=app_settings.group_commit_max_batch,
+)
+metrics.register(
+    "group_commit_batches_total", lambda: file_group_commit.batches
+)
+metrics.register("group_commit_items_total", lambda: file_group_commit.items)
+metrics.register("files_expired_total", lambda: file_crud.swept)
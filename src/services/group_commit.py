@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+Flush = Callable[[list[dict]], Awaitable[dict[Hashable, Any]]]
+
+
+class GroupCommit:
+    def __init__(self, flush: Flush, key: str, window: float, max_batch: int):
+        self._flush_batch = flush
+        self._key = key
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, value: dict) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((value, future))
+        if len(self._pending) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._start_flush)
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._flush(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self._flush_batch([value for value, _ in batch])
+        except Exception as e:
+            logger.exception("Group commit of %d items failed", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for value, future in batch:
+            if future.done():
+                continue
+            result = results.get(value[self._key])
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def drain(self) -> None:
+        self._start_flush()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
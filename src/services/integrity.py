@@ -0,0 +1,48 @@
+import binascii
+from base64 import b64decode, b64encode
+
+# Content-Digest algorithm names mapped to hashlib names
+DIGEST_ALGORITHMS = {"sha-256": "sha256", "sha-512": "sha512", "md5": "md5"}
+
+
+class InvalidDigest(Exception):
+    pass
+
+
+class DigestMismatch(Exception):
+    pass
+
+
+def _decode(value: str) -> str:
+    try:
+        return b64decode(value, validate=True).hex()
+    except binascii.Error:
+        raise InvalidDigest
+
+
+def expected_digests(
+    content_digest: str | None, content_md5: str | None
+) -> dict[str, str]:
+    digests = {}
+    # members look like sha-256=:<base64>:, unknown algorithms are skipped
+    for member in (content_digest or "").split(","):
+        key, _, value = member.partition(";")[0].strip().partition("=")
+        algorithm = DIGEST_ALGORITHMS.get(key.lower())
+        if algorithm is None:
+            continue
+        if len(value) < 2 or value[0] != ":" or value[-1] != ":":
+            raise InvalidDigest
+        digests[algorithm] = _decode(value[1:-1])
+    if content_md5 is not None:
+        digests["md5"] = _decode(content_md5.strip())
+    return digests
+
+
+def verify_digests(computed: dict[str, str], expected: dict[str, str]) -> None:
+    for algorithm, digest in expected.items():
+        if computed[algorithm] != digest:
+            raise DigestMismatch
+
+
+def format_digest(sha256: str) -> str:
+    return f"sha-256=:{b64encode(bytes.fromhex(sha256)).decode()}:"
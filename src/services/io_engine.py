@@ -0,0 +1,234 @@
+import asyncio
+import gzip
+import hashlib
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, BinaryIO, Callable, Iterable, TypeVar
+
+from core.config import app_settings
+from core.metrics import metrics
+
+T = TypeVar("T")
+
+
+def _fadvise(fd: int, offset: int, length: int, advice: str) -> None:
+    # posix_fadvise is missing on some platforms and only a hint anyway
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, offset, length, getattr(os, advice))
+
+
+def _write_all(fd: int, data: bytes | memoryview, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class IOEngine:
+    def __init__(
+        self,
+        max_workers: int,
+        buffer_size: int,
+        fallocate: bool,
+        dontneed_size: int,
+    ):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="storage-io"
+        )
+        # whole pages keep buffered transfers aligned to the page cache
+        self.buffer_size = -(-buffer_size // mmap.PAGESIZE) * mmap.PAGESIZE
+        self.fallocate = fallocate
+        self.dontneed_size = dontneed_size
+        self.pending = 0
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(
+                self._executor, partial(func, *args)
+            )
+        finally:
+            self.pending -= 1
+
+    def _preallocate(self, fd: int, size: int) -> None:
+        if not self.fallocate or not size:
+            return
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except (AttributeError, OSError):
+            pass
+
+    def _drop_cache(self, fd: int, size: int) -> None:
+        # written pages must be clean before the kernel can drop them
+        if size >= self.dontneed_size:
+            os.fdatasync(fd)
+            _fadvise(fd, 0, 0, "POSIX_FADV_DONTNEED")
+
+    def _write_file(
+        self,
+        source: BinaryIO,
+        blob_path: str,
+        size: int | None,
+        algorithms: Iterable[str],
+    ) -> dict[str, str]:
+        digests = {
+            algorithm: hashlib.new(algorithm) for algorithm in algorithms
+        }
+        fd = os.open(blob_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            self._preallocate(fd, size)
+            written = 0
+            while content := source.read(self.buffer_size):
+                for digest in digests.values():
+                    digest.update(content)
+                _write_all(fd, content, written)
+                written += len(content)
+            if size and written != size:
+                os.ftruncate(fd, written)
+            self._drop_cache(fd, written)
+        finally:
+            os.close(fd)
+        return {
+            algorithm: digest.hexdigest()
+            for algorithm, digest in digests.items()
+        }
+
+    async def write_file(
+        self,
+        source: BinaryIO,
+        blob_path: str,
+        size: int | None,
+        algorithms: Iterable[str] = ("sha256",),
+    ) -> dict[str, str]:
+        return await self.run(
+            self._write_file, source, blob_path, size, algorithms
+        )
+
+    def _write_bytes(self, blob_path: str, content: bytes) -> None:
+        fd = os.open(blob_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            _write_all(fd, content, 0)
+        finally:
+            os.close(fd)
+
+    async def write_bytes(self, blob_path: str, content: bytes) -> None:
+        await self.run(self._write_bytes, blob_path, content)
+
+    async def _write_chunks(
+        self, fd: int, offset: int, chunks: AsyncIterator[bytes]
+    ) -> int:
+        written = 0
+        buffer = bytearray()
+        async for content in chunks:
+            buffer += content
+            if len(buffer) < self.buffer_size:
+                continue
+            await self.run(_write_all, fd, buffer, offset + written)
+            written += len(buffer)
+            buffer = bytearray()
+        if buffer:
+            await self.run(_write_all, fd, buffer, offset + written)
+            written += len(buffer)
+        return written
+
+    async def write_at(
+        self, blob_path: str, offset: int, chunks: AsyncIterator[bytes]
+    ) -> int:
+        fd = await self.run(os.open, blob_path, os.O_WRONLY)
+        try:
+            written = await self._write_chunks(fd, offset, chunks)
+            await self.run(os.fsync, fd)
+        finally:
+            os.close(fd)
+        return written
+
+    async def spool(self, blob_path: str, chunks: AsyncIterator[bytes]) -> int:
+        fd = await self.run(
+            os.open, blob_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644
+        )
+        try:
+            return await self._write_chunks(fd, 0, chunks)
+        finally:
+            os.close(fd)
+
+    def _read_file(self, blob_path: str) -> bytes:
+        with open(blob_path, "rb", buffering=0) as in_file:
+            return in_file.read()
+
+    async def read_file(self, blob_path: str) -> bytes:
+        return await self.run(self._read_file, blob_path)
+
+    def _read_chunk(
+        self,
+        fd: int,
+        offset: int,
+        length: int,
+        chunk_size: int,
+        drop_cache: bool,
+    ) -> bytes:
+        content = os.pread(fd, min(chunk_size, length), offset)
+        # once a transfer passes dontneed_size, the pages it has sent are
+        # not worth keeping
+        if content and (drop_cache or offset >= self.dontneed_size):
+            _fadvise(fd, offset, len(content), "POSIX_FADV_DONTNEED")
+        return content
+
+    def _open_sequential(self, blob_path: str) -> int:
+        fd = os.open(blob_path, os.O_RDONLY)
+        _fadvise(fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+        return fd
+
+    async def iter_file(
+        self,
+        blob_path: str,
+        length: int,
+        chunk_size: int = 0,
+        drop_cache: bool = False,
+    ) -> AsyncIterator[bytes]:
+        chunk_size = chunk_size or self.buffer_size
+        fd = await self.run(self._open_sequential, blob_path)
+        try:
+            offset = 0
+            while offset < length:
+                content = await self.run(
+                    self._read_chunk,
+                    fd,
+                    offset,
+                    length - offset,
+                    chunk_size,
+                    drop_cache,
+                )
+                if not content:
+                    break
+                offset += len(content)
+                yield content
+        finally:
+            os.close(fd)
+
+    async def iter_compressed(self, blob_path: str) -> AsyncIterator[bytes]:
+        in_file = await self.run(gzip.open, blob_path, "rb")
+        try:
+            while content := await self.run(in_file.read, self.buffer_size):
+                yield content
+        finally:
+            in_file.close()
+
+
+io_engine = IOEngine(
+    max_workers=app_settings.storage_io_threads,
+    buffer_size=app_settings.storage_io_buffer_size,
+    fallocate=app_settings.storage_io_fallocate,
+    dontneed_size=app_settings.storage_io_dontneed_size,
+)
+metrics.register("storage_io_pending", lambda: io_engine.pending)
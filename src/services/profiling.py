@@ -0,0 +1,197 @@
+import asyncio
+import cProfile
+import hashlib
+import hmac
+import json
+import os
+import pstats
+import random
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from time import perf_counter
+from uuid import uuid4
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import app_settings
+from db.database import engine
+from services.admission import get_header
+
+PROFILE_HEADER = b"x-profile"
+TOP_FUNCTIONS = 50
+
+# queries are attributed to the request whose context runs them
+active_profile: ContextVar["RequestProfile | None"] = ContextVar(
+    "active_profile", default=None
+)
+
+
+def sign_profile_request(secret: str, path: str, expires: int) -> str:
+    message = f"{expires}:{path}".encode()
+    signature = hmac.new(secret.encode(), message, hashlib.sha256)
+    return f"{expires}:{signature.hexdigest()}"
+
+
+class RequestProfile:
+    def __init__(self, scope: Scope):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid4().hex[:8]}"
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.status_code: int | None = None
+        self.started = perf_counter()
+        self.duration = 0.0
+        self.queries: list[dict] = []
+        self.profiler = cProfile.Profile()
+
+    def functions(self) -> list[dict]:
+        stats = pstats.Stats(self.profiler).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+        functions = []
+        for (file_name, line, name), row in rows[:TOP_FUNCTIONS]:
+            _, calls, total_time, cumulative_time, _ = row
+            functions.append(
+                {
+                    "function": f"{file_name}:{line}({name})",
+                    "calls": calls,
+                    "total_time": total_time,
+                    "cumulative_time": cumulative_time,
+                }
+            )
+        return functions
+
+    def write(self, folder: str) -> None:
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, self.id)
+        self.profiler.dump_stats(f"{path}.prof")
+        report = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "duration": self.duration,
+            "queries": self.queries,
+            "functions": self.functions(),
+        }
+        with open(f"{path}.json", "w") as out_file:
+            json.dump(report, out_file, indent=2)
+
+
+def prune_profiles(folder: str, keep: int) -> None:
+    # ids start with the time, so names sort from the oldest
+    reports = sorted(
+        name for name in os.listdir(folder) if name.endswith(".json")
+    )
+    for name in reports[: max(len(reports) - keep, 0)]:
+        profile_id = name.removesuffix(".json")
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(folder, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        secret: str = "",
+        sample_rate: float = 0.0,
+        folder: str = "",
+        max_files: int = 0,
+    ):
+        self.app = app
+        self.secret = secret or app_settings.profiling_secret
+        self.sample_rate = sample_rate or app_settings.profiling_sample_rate
+        self.folder = folder or app_settings.profiling_folder
+        self.max_files = max_files or app_settings.profiling_max_files
+        # the profiler covers the whole thread, so one request at a time
+        self._lock = asyncio.Lock()
+        event.listen(
+            engine.sync_engine, "before_cursor_execute", self._before_query
+        )
+        event.listen(
+            engine.sync_engine, "after_cursor_execute", self._after_query
+        )
+
+    def _before_query(self, conn, cursor, statement, *args) -> None:
+        if active_profile.get() is not None:
+            conn.info.setdefault("profile_started", []).append(perf_counter())
+
+    def _after_query(self, conn, cursor, statement, *args) -> None:
+        profile = active_profile.get()
+        started = conn.info.get("profile_started")
+        if not started:
+            return
+        start = started.pop()
+        if profile is None:
+            return
+        profile.queries.append(
+            {
+                "statement": statement,
+                "start": start - profile.started,
+                "duration": perf_counter() - start,
+            }
+        )
+
+    def _is_signed(self, scope: Scope) -> bool:
+        header = get_header(scope, PROFILE_HEADER)
+        if not self.secret or header is None:
+            return False
+        expires, _, _ = header.partition(":")
+        if not expires.isdigit() or int(expires) < time.time():
+            return False
+        expected = sign_profile_request(
+            self.secret, scope["path"], int(expires)
+        )
+        return hmac.compare_digest(expected, header)
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if scope["type"] != "http":
+            return False
+        # signed requests wait for their turn, samples are only taken
+        # while the profiler is free
+        if self._is_signed(scope):
+            return True
+        return not self._lock.locked() and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        async with self._lock:
+            profile = RequestProfile(scope)
+            try:
+                await self._profile(profile, scope, receive, send)
+            finally:
+                await asyncio.to_thread(self._write, profile)
+
+    def _write(self, profile: RequestProfile) -> None:
+        profile.write(self.folder)
+        prune_profiles(self.folder, self.max_files)
+
+    async def _profile(
+        self,
+        profile: RequestProfile,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile.id.encode()),
+                ]
+            await send(message)
+
+        token = active_profile.set(profile)
+        profile.profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.profiler.disable()
+            profile.duration = perf_counter() - profile.started
+            active_profile.reset(token)
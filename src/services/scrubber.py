@@ -0,0 +1,113 @@
+import logging
+import zlib
+from datetime import datetime, timedelta
+from hashlib import sha256
+
+from sqlalchemy import func, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from core.metrics import metrics
+from models.file_model import File as FileModel
+from services.io_engine import io_engine
+from services.storage import iter_stored_blob
+from services.throttle import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class Scrubber:
+    def __init__(self, in_folder: str, rate: int):
+        self.in_folder = in_folder
+        # one bucket for all runs keeps the disk budget steady
+        self._bucket = TokenBucket(rate, rate) if rate else None
+        self.verified = 0
+        self.corrupted = 0
+
+    async def _hash(self, row: Row) -> str | None:
+        digest = sha256()
+        try:
+            async for content in iter_stored_blob(row, self.in_folder):
+                if self._bucket is not None:
+                    await self._bucket.consume(len(content))
+                await io_engine.run(digest.update, content)
+        except FileNotFoundError:
+            raise
+        except (OSError, EOFError, zlib.error):
+            return None
+        return digest.hexdigest()
+
+    async def _record(self, db: AsyncSession, row: Row, digest: str | None):
+        now = func.timezone("utc", func.now())
+        corrupted = digest is None or row.sha256 not in (None, digest)
+        # corrupted files keep their last good verification and are left
+        # out of scrubbing until new content is written
+        if corrupted:
+            values = {"corrupted_at": now}
+        else:
+            values = {"verified_at": now}
+        if row.sha256 is None and digest is not None:
+            values["sha256"] = digest
+        # a file written meanwhile is verified again on a later run
+        statement = (
+            update(FileModel)
+            .where(
+                (FileModel.id == row.id) & (FileModel.version == row.version)
+            )
+            .values(**values)
+            .returning(FileModel.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated = await db.scalar(statement)
+        await db.commit()
+        if updated is None:
+            return
+        if corrupted:
+            self.corrupted += 1
+            logger.error("Stored content of file %s is corrupted", row.id)
+        else:
+            self.verified += 1
+
+    async def scrub(self, db: AsyncSession) -> None:
+        cutoff = datetime.utcnow() - timedelta(
+            seconds=app_settings.scrub_reverify_after
+        )
+        statement = (
+            select(
+                FileModel.id,
+                FileModel.version,
+                FileModel.size,
+                FileModel.sha256,
+                FileModel.segment,
+                FileModel.segment_offset,
+                FileModel.tier,
+                FileModel.volume,
+            )
+            .where(
+                (
+                    FileModel.verified_at.is_(None)
+                    | (FileModel.verified_at < cutoff)
+                )
+                & FileModel.corrupted_at.is_(None)
+            )
+            .order_by(FileModel.verified_at.asc().nulls_first())
+            .limit(app_settings.scrub_batch_size)
+        )
+        rows = (await db.execute(statement=statement)).all()
+        # no transaction stays open while the blobs are read
+        await db.commit()
+        for row in rows:
+            try:
+                digest = await self._hash(row)
+            except FileNotFoundError:
+                # moved by demotion, rebalancing or deletion meanwhile
+                continue
+            await self._record(db, row, digest)
+
+
+scrubber = Scrubber(
+    in_folder=app_settings.storage_folder, rate=app_settings.scrub_rate
+)
+metrics.register("scrub_verified_total", lambda: scrubber.verified)
+metrics.register("scrub_corrupted_total", lambda: scrubber.corrupted)
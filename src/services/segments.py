@@ -0,0 +1,217 @@
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from uuid import uuid4
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from core.metrics import metrics
+from models.file_model import File as FileModel
+from services.io_engine import io_engine
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentStore:
+    def __init__(self, folder: str, max_blob_size: int, max_size: int):
+        self.folder = folder
+        self.max_blob_size = max_blob_size
+        self.max_size = max_size
+        self._lock = asyncio.Lock()
+        self._fd: int | None = None
+        self._name: str | None = None
+        self._size = 0
+        self.compacted_bytes = 0
+
+    def accepts(self, size: int | None) -> bool:
+        return (
+            app_settings.segment_storage_enabled
+            and size is not None
+            and size <= self.max_blob_size
+        )
+
+    def segment_path(self, segment: str) -> str:
+        return os.path.join(self.folder, segment)
+
+    def _rotate(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+        os.makedirs(self.folder, exist_ok=True)
+        self._name = uuid4().hex
+        self._fd = os.open(
+            self.segment_path(self._name),
+            os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+            0o644,
+        )
+        # a shared lock marks the segment as open for appends
+        fcntl.flock(self._fd, fcntl.LOCK_SH)
+        self._size = 0
+
+    def _append(self, data: bytes) -> tuple[str, int]:
+        if self._fd is None or self._size + len(data) > self.max_size:
+            self._rotate()
+        offset = self._size
+        os.write(self._fd, data)
+        self._size += len(data)
+        return self._name, offset
+
+    async def append(self, data: bytes) -> tuple[str, int]:
+        async with self._lock:
+            return await io_engine.run(self._append, data)
+
+    def _read(self, segment: str, offset: int, length: int) -> bytes:
+        fd = os.open(self.segment_path(segment), os.O_RDONLY)
+        try:
+            return os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+
+    async def read(self, segment: str, offset: int, length: int) -> bytes:
+        return await io_engine.run(self._read, segment, offset, length)
+
+    def is_sealed(self, segment: str) -> bool:
+        path = self.segment_path(segment)
+        if time.time() - os.stat(path).st_mtime < (
+            app_settings.segment_compaction_grace
+        ):
+            return False
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        finally:
+            os.close(fd)
+        return True
+
+    def list_segments(self) -> dict[str, int]:
+        if not os.path.isdir(self.folder):
+            return {}
+        return {
+            entry.name: entry.stat().st_size
+            for entry in os.scandir(self.folder)
+            if entry.is_file()
+        }
+
+    def _marker_path(self, segment: str) -> str:
+        return os.path.join(self.folder, "retired", segment)
+
+    def retire(self, segment: str) -> None:
+        # the marker's mtime starts the grace period for readers that
+        # still hold the old location, in whichever worker runs next
+        path = self._marker_path(segment)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a"):
+            pass
+        os.utime(path)
+
+    def purge_retired(self, live: dict[str, int]) -> set[str]:
+        folder = os.path.join(self.folder, "retired")
+        if not os.path.isdir(folder):
+            return set()
+        retired = set()
+        for entry in os.scandir(folder):
+            retired.add(entry.name)
+            if entry.name in live or time.time() - entry.stat().st_mtime < (
+                app_settings.segment_compaction_grace
+            ):
+                continue
+            try:
+                os.remove(self.segment_path(entry.name))
+            except FileNotFoundError:
+                pass
+            os.remove(entry.path)
+        return retired
+
+    async def compact(self, db: AsyncSession) -> None:
+        segments = self.list_segments()
+        if not segments:
+            return
+        entries = (
+            select(FileModel.segment, FileModel.segment_offset, FileModel.size)
+            .where(FileModel.segment.in_(segments))
+            .distinct()
+            .subquery()
+        )
+        results = await db.execute(
+            select(entries.c.segment, func.sum(entries.c.size)).group_by(
+                entries.c.segment
+            )
+        )
+        live = dict(results.all())
+        await db.commit()
+        retired = await io_engine.run(self.purge_retired, live)
+        for segment, size in segments.items():
+            if segment == self._name or not size:
+                continue
+            # retired segments are compacted again only if rows came back
+            if segment in retired and segment not in live:
+                continue
+            ratio = live.get(segment, 0) / size
+            if ratio >= app_settings.segment_compaction_ratio:
+                continue
+            if not await io_engine.run(self.is_sealed, segment):
+                continue
+            await self._compact_segment(db, segment)
+            await io_engine.run(self.retire, segment)
+            self.compacted_bytes += size - live.get(segment, 0)
+
+    async def _remap(self, db: AsyncSession, moved: list[dict]) -> None:
+        table = FileModel.__table__
+        await db.execute(
+            update(table)
+            .where(
+                (table.c.segment == bindparam("old_segment"))
+                & (table.c.segment_offset == bindparam("old_offset"))
+            )
+            .values(
+                segment=bindparam("new_segment"),
+                segment_offset=bindparam("new_offset"),
+            ),
+            moved,
+        )
+        await db.commit()
+
+    async def _compact_segment(self, db: AsyncSession, segment: str) -> None:
+        results = await db.execute(
+            select(FileModel.segment_offset, FileModel.size)
+            .where(FileModel.segment == segment)
+            .distinct()
+        )
+        offsets = results.all()
+        # no transaction stays open while the blobs are copied
+        await db.commit()
+        moved = []
+        for offset, size in offsets:
+            data = await self.read(segment, offset, size)
+            new_segment, new_offset = await self.append(data)
+            moved.append(
+                {
+                    "old_segment": segment,
+                    "old_offset": offset,
+                    "new_segment": new_segment,
+                    "new_offset": new_offset,
+                }
+            )
+        if moved:
+            await self._remap(db, moved)
+            # copies lock their source for share, so any copy that read the
+            # old location has committed by now and is remapped here
+            await self._remap(db, moved)
+        logger.info(
+            "Compacted segment %s, %d blobs moved", segment, len(moved)
+        )
+
+
+segment_store = SegmentStore(
+    folder=os.path.join(app_settings.storage_folder, "segments"),
+    max_blob_size=app_settings.segment_max_blob_size,
+    max_size=app_settings.segment_max_size,
+)
+metrics.register(
+    "segment_compacted_bytes_total", lambda: segment_store.compacted_bytes
+)
@@ -0,0 +1,259 @@
+import hashlib
+import os
+import shutil
+from mimetypes import guess_type
+from typing import Any, AsyncIterator, Iterable
+from uuid import UUID, uuid4
+
+from fastapi import UploadFile
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.engine import Row
+
+from core.config import app_settings
+from models.file_model import File as FileModel
+from services.cache import content_cache
+from services.integrity import verify_digests
+from services.io_engine import io_engine, remove_file
+from services.segments import segment_store
+from services.throttle import download_throttle
+from services.tiering import COLD, tier_store
+from services.volumes import volume_set
+
+
+async def write_blob(
+    in_file: UploadFile, blob_path: str, algorithms: Iterable[str]
+) -> dict[str, str]:
+    return await io_engine.write_file(
+        in_file.file, blob_path, in_file.size, algorithms
+    )
+
+
+async def store_blob(
+    in_file: UploadFile, blob_path: str, expected: dict[str, str]
+) -> dict[str, Any]:
+    # digests are taken while the bytes are written, and checked against
+    # the client's before the row can be committed
+    algorithms = {"sha256", *expected}
+    if segment_store.accepts(in_file.size):
+        content = await in_file.read()
+        digests = {
+            algorithm: hashlib.new(algorithm, content).hexdigest()
+            for algorithm in algorithms
+        }
+        verify_digests(digests, expected)
+        segment, offset = await segment_store.append(content)
+        return {
+            "segment": segment,
+            "segment_offset": offset,
+            "sha256": digests["sha256"],
+        }
+    digests = await write_blob(in_file, blob_path, algorithms)
+    verify_digests(digests, expected)
+    return {
+        "segment": None,
+        "segment_offset": None,
+        "sha256": digests["sha256"],
+    }
+
+
+async def read_blob(file_obj: FileModel, in_folder: str) -> bytes:
+    if file_obj.segment is not None:
+        return await segment_store.read(
+            file_obj.segment, file_obj.segment_offset, file_obj.size
+        )
+    if file_obj.tier == COLD:
+        return await tier_store.read(file_obj.id)
+    blob_path = volume_set.blob_path(file_obj.id, file_obj.volume, in_folder)
+    return await io_engine.read_file(blob_path)
+
+
+async def iter_stored_blob(
+    file_obj: FileModel | Row, in_folder: str
+) -> AsyncIterator[bytes]:
+    if file_obj.segment is not None:
+        yield await read_blob(file_obj, in_folder)
+    elif file_obj.tier == COLD:
+        async for content in io_engine.iter_compressed(
+            tier_store.cold_path(file_obj.id)
+        ):
+            yield content
+    else:
+        # background readers should not push downloads out of the cache
+        async for content in io_engine.iter_file(
+            volume_set.blob_path(file_obj.id, file_obj.volume, in_folder),
+            file_obj.size,
+            drop_cache=True,
+        ):
+            yield content
+
+
+async def iter_content(content: bytes) -> AsyncIterator[bytes]:
+    chunk_size = app_settings.download_chunk_size
+    for start in range(0, len(content), chunk_size):
+        end = start + chunk_size
+        yield content[start:end]
+
+
+async def blob_response(
+    file_obj: FileModel,
+    in_folder: str,
+    headers: dict[str, str],
+    user_id: int,
+) -> Response:
+    media_type = guess_type(file_obj.name)[0] or "text/plain"
+    content = None
+    if content_cache.accepts(file_obj.size):
+        content = content_cache.get(file_obj.id, file_obj.version)
+        if content is None:
+            content = await read_blob(file_obj, in_folder)
+            content_cache.put(file_obj.id, file_obj.version, content)
+    elif file_obj.segment is not None:
+        content = await read_blob(file_obj, in_folder)
+    if content is not None:
+        if not download_throttle.enabled:
+            return Response(content, media_type=media_type, headers=headers)
+        chunks = iter_content(content)
+        content_length = len(content)
+    else:
+        blob_path = volume_set.blob_path(
+            file_obj.id, file_obj.volume, in_folder
+        )
+        # throttled streams keep small chunks so the buckets pace evenly
+        chunk_size = (
+            app_settings.download_chunk_size
+            if download_throttle.enabled
+            else 0
+        )
+        # the row size bounds the read, bytes appended later are not served
+        chunks = io_engine.iter_file(blob_path, file_obj.size, chunk_size)
+        content_length = file_obj.size
+    if download_throttle.enabled:
+        chunks = download_throttle.throttle(user_id, chunks)
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={**headers, "Content-Length": str(content_length)},
+    )
+
+
+async def write_blob_at(
+    blob_path: str, offset: int, chunks: AsyncIterator[bytes]
+) -> int:
+    return await io_engine.write_at(blob_path, offset, chunks)
+
+
+async def spool_blob(spool_path: str, chunks: AsyncIterator[bytes]) -> int:
+    return await io_engine.spool(spool_path, chunks)
+
+
+async def write_spool_at(
+    blob_path: str, offset: int, spool_path: str, size: int
+) -> int:
+    # the spool is read once, so its pages are not kept
+    return await write_blob_at(
+        blob_path,
+        offset,
+        io_engine.iter_file(spool_path, size, drop_cache=True),
+    )
+
+
+async def truncate_blob(blob_path: str, size: int) -> None:
+    await io_engine.run(os.truncate, blob_path, size)
+
+
+def is_shared_blob(blob_path: str) -> bool:
+    return os.stat(blob_path).st_nlink > 1
+
+
+async def copy_stored_blob(
+    file_obj: FileModel, in_folder: str, destination: str
+) -> None:
+    # the copy is private to the file, unlike segments and hardlinks
+    if file_obj.segment is not None:
+        content = await read_blob(file_obj, in_folder)
+        await io_engine.write_bytes(destination, content)
+    elif file_obj.tier == COLD:
+        await io_engine.run(
+            tier_store.decompress,
+            tier_store.cold_path(file_obj.id),
+            destination,
+        )
+    else:
+        blob_path = volume_set.blob_path(
+            file_obj.id, file_obj.volume, in_folder
+        )
+        await io_engine.run(shutil.copyfile, blob_path, destination)
+
+
+async def remove_blob(blob_path: str) -> None:
+    await io_engine.run(remove_file, blob_path)
+
+
+async def remove_blobs(blob_paths: Iterable[str]) -> None:
+    for blob_path in blob_paths:
+        await remove_blob(blob_path)
+
+
+def _link_or_copy(source: str, destination: str) -> None:
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def _backup(blob_path: str) -> str | None:
+    backup_path = f"{blob_path}.{uuid4().hex}.bak"
+    try:
+        _link_or_copy(blob_path, backup_path)
+    except FileNotFoundError:
+        return None
+    return backup_path
+
+
+async def backup_blob(blob_path: str) -> str | None:
+    return await io_engine.run(_backup, blob_path)
+
+
+async def replace_blob(source: str, destination: str) -> None:
+    await io_engine.run(os.replace, source, destination)
+
+
+async def link_blob(source: str, destination: str) -> None:
+    await io_engine.run(_link_or_copy, source, destination)
+
+
+async def link_stored_blob(
+    source_id: UUID,
+    file_id: UUID,
+    tier: str,
+    volume: str | None,
+    in_folder: str,
+) -> None:
+    # copies stay on the volume of their source so they can be hardlinked
+    if tier == COLD:
+        await link_blob(
+            tier_store.cold_path(source_id), tier_store.cold_path(file_id)
+        )
+    else:
+        await link_blob(
+            volume_set.blob_path(source_id, volume, in_folder),
+            volume_set.blob_path(file_id, volume, in_folder),
+        )
+
+
+async def share_blob(
+    file_obj: FileModel | Row, file_id: UUID, in_folder: str
+) -> None:
+    # segment entries are immutable and can be shared as they are
+    if file_obj.segment is None:
+        await link_stored_blob(
+            file_obj.id, file_id, file_obj.tier, file_obj.volume, in_folder
+        )
+
+
+def blob_paths(file_id: UUID, volume: str | None, in_folder: str) -> list[str]:
+    # the tier may change until the row is gone, so both are removed
+    return [
+        volume_set.blob_path(file_id, volume, in_folder),
+        tier_store.cold_path(file_id),
+    ]
@@ -0,0 +1,110 @@
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator
+
+from core.config import app_settings
+from core.metrics import metrics
+
+
+class TokenBucket:
+    def __init__(self, rate: int, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        # asyncio.Lock wakes waiters in FIFO order, so streams sharing a
+        # bucket take turns chunk by chunk
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self._tokens >= self.burst
+
+    async def consume(self, amount: int) -> None:
+        async with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return
+            await asyncio.sleep((amount - self._tokens) / self.rate)
+            self._tokens = 0.0
+            self._updated = monotonic()
+
+
+class DownloadThrottle:
+    def __init__(self, rate: int, user_rate: int):
+        self.rate = rate
+        self.user_rate = user_rate
+        self._global = TokenBucket(rate, rate) if rate else None
+        # buckets outlive their streams until they have refilled, so
+        # back to back downloads do not start with a fresh burst each
+        self._users: OrderedDict[int, TokenBucket] = OrderedDict()
+        self._streams: dict[int, int] = {}
+        self.active_streams = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rate or self.user_rate)
+
+    def _evict_idle(self) -> None:
+        # least recently used first, a full idle bucket is the same as a
+        # new one and can go
+        while self._users:
+            user_id, bucket = next(iter(self._users.items()))
+            if user_id in self._streams or not bucket.is_full():
+                return
+            del self._users[user_id]
+
+    def user_bucket(self, user_id: int) -> TokenBucket:
+        self._evict_idle()
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_rate)
+            self._users[user_id] = bucket
+        self._users.move_to_end(user_id)
+        return bucket
+
+    @asynccontextmanager
+    async def stream(self, user_id: int) -> AsyncIterator[list[TokenBucket]]:
+        buckets = []
+        if self.user_rate:
+            buckets.append(self.user_bucket(user_id))
+            self._streams[user_id] = self._streams.get(user_id, 0) + 1
+        if self._global is not None:
+            buckets.append(self._global)
+        self.active_streams += 1
+        try:
+            yield buckets
+        finally:
+            self.active_streams -= 1
+            if self.user_rate:
+                self._streams[user_id] -= 1
+                if not self._streams[user_id]:
+                    del self._streams[user_id]
+
+    async def throttle(
+        self, user_id: int, chunks: AsyncIterator[bytes]
+    ) -> AsyncIterator[bytes]:
+        async with self.stream(user_id) as buckets:
+            async for chunk in chunks:
+                for bucket in buckets:
+                    await bucket.consume(len(chunk))
+                yield chunk
+
+
+download_throttle = DownloadThrottle(
+    rate=app_settings.download_rate_limit,
+    user_rate=app_settings.download_user_rate_limit,
+)
+metrics.register(
+    "download_throttled_streams", lambda: download_throttle.active_streams
+)
@@ -0,0 +1,231 @@
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+from sqlalchemy import DateTime, bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from core.config import app_settings
+from core.metrics import metrics
+from models.file_model import COLD, HOT
+from models.file_model import File as FileModel
+from services.io_engine import io_engine, remove_file
+from services.volumes import volume_set
+
+logger = logging.getLogger(__name__)
+
+
+class AccessTracker:
+    def __init__(self):
+        self._pending: dict[UUID, datetime] = {}
+        self.flushed = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def touch(self, file_id: UUID) -> None:
+        self._pending[file_id] = datetime.utcnow()
+
+    async def flush(self, db: AsyncSession) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        table = FileModel.__table__
+        last_access = bindparam("last_access", type_=DateTime)
+        # sorted ids keep row lock order stable between workers
+        try:
+            await db.execute(
+                update(table)
+                .where(table.c.id == bindparam("file_id"))
+                .values(
+                    accessed_at=func.greatest(
+                        func.coalesce(table.c.accessed_at, last_access),
+                        last_access,
+                    )
+                ),
+                [
+                    {"file_id": file_id, "last_access": accessed_at}
+                    for file_id, accessed_at in sorted(pending.items())
+                ],
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            for file_id, accessed_at in pending.items():
+                self._pending.setdefault(file_id, accessed_at)
+            raise
+        self.flushed += len(pending)
+
+
+class TierStore:
+    def __init__(self, hot_folder: str, cold_folder: str, compress_level: int):
+        self.hot_folder = hot_folder
+        self.cold_folder = cold_folder
+        self.compress_level = compress_level
+        self.demoted = 0
+        self.promoted = 0
+
+    def hot_path(self, file_id: UUID, volume: str | None) -> str:
+        return volume_set.blob_path(file_id, volume, self.hot_folder)
+
+    def cold_path(self, file_id: UUID) -> str:
+        return os.path.join(self.cold_folder, f"{file_id}.gz")
+
+    def _compress(self, source: str, destination: str) -> None:
+        os.makedirs(self.cold_folder, exist_ok=True)
+        tmp_path = f"{destination}.{uuid4().hex}.tmp"
+        try:
+            with open(source, "rb") as in_file, open(
+                tmp_path, "wb"
+            ) as raw_file:
+                with gzip.GzipFile(
+                    fileobj=raw_file,
+                    mode="wb",
+                    compresslevel=self.compress_level,
+                ) as out_file:
+                    shutil.copyfileobj(
+                        in_file, out_file, io_engine.buffer_size
+                    )
+                raw_file.flush()
+                os.fsync(raw_file.fileno())
+            os.replace(tmp_path, destination)
+        except BaseException:
+            remove_file(tmp_path)
+            raise
+
+    def decompress(self, source: str, destination: str) -> None:
+        with gzip.open(source, "rb") as in_file, open(
+            destination, "wb"
+        ) as out_file:
+            shutil.copyfileobj(in_file, out_file, io_engine.buffer_size)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+
+    def _read(self, file_id: UUID) -> bytes:
+        with gzip.open(self.cold_path(file_id), "rb") as in_file:
+            return in_file.read()
+
+    async def read(self, file_id: UUID) -> bytes:
+        return await io_engine.run(self._read, file_id)
+
+    async def remove(self, file_id: UUID) -> None:
+        await io_engine.run(remove_file, self.cold_path(file_id))
+
+    async def promote(self, db: AsyncSession, file_obj: FileModel) -> None:
+        if file_obj.tier != COLD:
+            return
+        hot_path = self.hot_path(file_obj.id, file_obj.volume)
+        tmp_path = f"{hot_path}.{uuid4().hex}.tmp"
+        promoted = False
+        try:
+            await io_engine.run(
+                self.decompress, self.cold_path(file_obj.id), tmp_path
+            )
+            statement = (
+                update(FileModel)
+                .where(
+                    (FileModel.id == file_obj.id) & (FileModel.tier == COLD)
+                )
+                .values(tier=HOT, accessed_at=datetime.utcnow())
+                .returning(FileModel.id)
+                .execution_options(synchronize_session=False)
+            )
+            results = await db.execute(statement=statement)
+            promoted = results.scalar_one_or_none() is not None
+            if promoted:
+                await io_engine.run(os.replace, tmp_path, hot_path)
+            await db.commit()
+        except FileNotFoundError:
+            # a concurrent request already promoted the file
+            await db.rollback()
+        except Exception:
+            await db.rollback()
+            promoted = False
+            raise
+        finally:
+            if not promoted:
+                await io_engine.run(remove_file, tmp_path)
+        set_committed_value(file_obj, "tier", HOT)
+        if promoted:
+            self.promoted += 1
+            await self.remove(file_obj.id)
+
+    async def demote(self, db: AsyncSession) -> None:
+        cutoff = datetime.utcnow() - timedelta(
+            seconds=app_settings.tier_cold_after
+        )
+        last_access = func.coalesce(
+            FileModel.accessed_at, FileModel.created_ad
+        )
+        results = await db.execute(
+            select(FileModel.id, FileModel.version, FileModel.volume)
+            .where(
+                (FileModel.tier == HOT)
+                & FileModel.segment.is_(None)
+                & (last_access < cutoff)
+            )
+            .order_by(last_access)
+            .limit(app_settings.tier_batch_size)
+        )
+        candidates = results.all()
+        await db.rollback()
+        demoted = {}
+        for file_id, version, volume in candidates:
+            cold_path = self.cold_path(file_id)
+            hot_path = self.hot_path(file_id, volume)
+            try:
+                await io_engine.run(self._compress, hot_path, cold_path)
+            except FileNotFoundError:
+                continue
+            # a newer version written or moved meanwhile keeps the file hot
+            statement = (
+                update(FileModel)
+                .where(
+                    (FileModel.id == file_id)
+                    & (FileModel.version == version)
+                    & (FileModel.tier == HOT)
+                    & FileModel.volume.is_not_distinct_from(volume)
+                )
+                .values(tier=COLD)
+                .returning(FileModel.id)
+                .execution_options(synchronize_session=False)
+            )
+            results = await db.execute(statement=statement)
+            if results.scalar_one_or_none() is None:
+                await db.rollback()
+                await io_engine.run(remove_file, cold_path)
+                continue
+            await db.commit()
+            demoted[file_id] = hot_path
+        if not demoted:
+            return
+        # readers may still hold the hot location
+        await asyncio.sleep(app_settings.tier_grace)
+        # the row lock keeps a concurrent promotion from being undone
+        results = await db.execute(
+            select(FileModel.id)
+            .where(FileModel.id.in_(demoted) & (FileModel.tier == COLD))
+            .with_for_update()
+        )
+        for file_id in results.scalars().all():
+            await io_engine.run(remove_file, demoted[file_id])
+            self.demoted += 1
+        await db.commit()
+        logger.info("Moved %d files to the cold tier", len(demoted))
+
+
+access_tracker = AccessTracker()
+tier_store = TierStore(
+    hot_folder=app_settings.storage_folder,
+    cold_folder=app_settings.tier_cold_folder,
+    compress_level=app_settings.tier_compress_level,
+)
+metrics.register("access_pending", lambda: len(access_tracker))
+metrics.register("access_flushed_total", lambda: access_tracker.flushed)
+metrics.register("tier_demoted_total", lambda: tier_store.demoted)
+metrics.register("tier_promoted_total", lambda: tier_store.promoted)
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+import random
+import shutil
+from time import monotonic
+from uuid import UUID, uuid4
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from core.metrics import metrics
+from models.file_model import HOT
+from models.file_model import File as FileModel
+from services.io_engine import io_engine, remove_file
+
+logger = logging.getLogger(__name__)
+
+
+def _move_blob(source: str, destination: str) -> None:
+    tmp_path = f"{destination}.{uuid4().hex}.tmp"
+    try:
+        try:
+            # a volume on the same device only needs a new name
+            os.link(source, tmp_path)
+        except OSError:
+            with open(source, "rb") as in_file, open(
+                tmp_path, "wb"
+            ) as out_file:
+                shutil.copyfileobj(in_file, out_file, io_engine.buffer_size)
+                out_file.flush()
+                os.fsync(out_file.fileno())
+        os.replace(tmp_path, destination)
+    except BaseException:
+        remove_file(tmp_path)
+        raise
+
+
+class VolumeSet:
+    def __init__(
+        self, default_folder: str, folders: dict[str, str], draining: list[str]
+    ):
+        self.default_folder = default_folder
+        self.folders = folders
+        self.draining = set(draining)
+        self.moved = 0
+        self._free: dict[str | None, int] = {}
+        self._free_checked: float | None = None
+
+    def folder(self, volume: str | None) -> str:
+        if volume is None:
+            return self.default_folder
+        return os.path.join(self.folders[volume], "")
+
+    def blob_path(
+        self, file_id: UUID, volume: str | None, in_folder: str
+    ) -> str:
+        # files written before volumes were configured stay in in_folder
+        if volume is None:
+            return in_folder + str(file_id)
+        return self.folder(volume) + str(file_id)
+
+    def writable(self) -> list[str]:
+        return [
+            volume for volume in self.folders if volume not in self.draining
+        ]
+
+    def used_ratio(self, volume: str | None) -> float:
+        usage = shutil.disk_usage(self.folder(volume))
+        return usage.used / usage.total
+
+    def _disk_free(self) -> dict[str | None, int]:
+        return {
+            volume: shutil.disk_usage(self.folder(volume)).free
+            for volume in self.writable() or [None]
+        }
+
+    async def free_space(self) -> dict[str | None, int]:
+        # uploads ask for every file, so statvfs runs at most once per ttl
+        # and off the event loop
+        if (
+            self._free_checked is None
+            or monotonic() - self._free_checked
+            >= app_settings.storage_free_space_ttl
+            or self._free.keys() != set(self.writable() or [None])
+        ):
+            self._free = await io_engine.run(self._disk_free)
+            self._free_checked = monotonic()
+        return self._free
+
+    async def max_free_space(self) -> int:
+        return max((await self.free_space()).values())
+
+    async def choose(self, exclude: str | None = None) -> str | None:
+        volumes = [volume for volume in self.writable() if volume != exclude]
+        if not volumes:
+            return None
+        free = await self.free_space()
+        # weighting by free space fills volumes of any size evenly
+        weights = [free[volume] for volume in volumes]
+        if not any(weights):
+            return None
+        return random.choices(volumes, weights=weights)[0]
+
+    def sources(self) -> list[str | None]:
+        writable = self.writable()
+        if not writable:
+            return []
+        sources: list[str | None] = [None]
+        sources.extend(
+            volume for volume in self.draining if volume in self.folders
+        )
+        ratios = {volume: self.used_ratio(volume) for volume in writable}
+        fullest = max(ratios, key=ratios.get)
+        emptiest = min(ratios, key=ratios.get)
+        if (
+            ratios[fullest] - ratios[emptiest]
+            > app_settings.storage_rebalance_threshold
+        ):
+            sources.append(fullest)
+        return sources
+
+    async def rebalance(self, db: AsyncSession) -> None:
+        sources = await io_engine.run(self.sources)
+        if not sources:
+            return
+        volumes = [volume for volume in sources if volume is not None]
+        results = await db.execute(
+            select(FileModel.id, FileModel.version, FileModel.volume)
+            .where(
+                (FileModel.tier == HOT)
+                & FileModel.segment.is_(None)
+                & (FileModel.volume.is_(None) | FileModel.volume.in_(volumes))
+            )
+            .order_by(FileModel.size.desc())
+            .limit(app_settings.storage_rebalance_batch_size)
+        )
+        candidates = results.all()
+        await db.rollback()
+        moved = []
+        for file_id, version, volume in candidates:
+            destination = await self.choose(volume)
+            if destination is None:
+                break
+            source_path = self.blob_path(file_id, volume, self.default_folder)
+            destination_path = self.blob_path(
+                file_id, destination, self.default_folder
+            )
+            try:
+                await io_engine.run(_move_blob, source_path, destination_path)
+            except FileNotFoundError:
+                continue
+            # a newer version or another tier keeps the file in place
+            statement = (
+                update(FileModel)
+                .where(
+                    (FileModel.id == file_id)
+                    & (FileModel.version == version)
+                    & (FileModel.tier == HOT)
+                    & FileModel.volume.is_not_distinct_from(volume)
+                )
+                .values(volume=destination)
+                .returning(FileModel.id)
+                .execution_options(synchronize_session=False)
+            )
+            results = await db.execute(statement=statement)
+            if results.scalar_one_or_none() is None:
+                await db.rollback()
+                await io_engine.run(remove_file, destination_path)
+                continue
+            await db.commit()
+            moved.append(source_path)
+        if not moved:
+            return
+        # readers may still hold the old location
+        await asyncio.sleep(app_settings.storage_rebalance_grace)
+        for source_path in moved:
+            await io_engine.run(remove_file, source_path)
+        self.moved += len(moved)
+        logger.info("Moved %d files between volumes", len(moved))
+
+
+volume_set = VolumeSet(
+    default_folder=app_settings.storage_folder,
+    folders=app_settings.storage_volumes,
+    draining=app_settings.storage_volumes_draining,
+)
+metrics.register("volume_moved_total", lambda: volume_set.moved)
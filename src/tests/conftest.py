@@ -3,6 +3,7 @@ from pathlib import Path
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from core.sqlalhemy_utils_async import create_database, database_exists
@@ -23,6 +24,9 @@ async def async_session() -> AsyncSession:
     session = async_sessionmaker(engine, expire_on_commit=False)
     async with session():
         async with engine.begin() as connect:
+            await connect.execute(
+                text("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            )
             await connect.run_sync(Base.metadata.create_all)
 
         yield session
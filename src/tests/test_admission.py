@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from jose import jwt
+
+from core.config import app_settings
+from core.metrics import metrics
+from services.admission import (UploadAdmission, UploadAdmissionMiddleware,
+                                UploadRejected, upload_admission)
+from services.volumes import volume_set
+
+
+async def accept_upload(scope, receive, send):
+    await send({"type": "http.response.start", "status": 201, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def make_admission(**kwargs) -> UploadAdmission:
+    settings = {
+        "max_concurrent": 1,
+        "max_per_user": 2,
+        "max_queue": 1,
+        "queue_timeout": 1.0,
+    }
+    settings.update(kwargs)
+    return UploadAdmission(**settings)
+
+
+def auth_headers(user: str) -> dict[str, str]:
+    token = jwt.encode(
+        {"sub": user}, app_settings.secret_key, app_settings.algorithm
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def test_per_user_limit():
+    admission = make_admission(max_concurrent=5)
+    async with admission.admit("alice"), admission.admit("alice"):
+        with pytest.raises(UploadRejected) as e:
+            async with admission.admit("alice"):
+                pass
+        assert e.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        async with admission.admit("bob"):
+            pass
+    assert admission.rejected == 1
+
+
+async def test_queue_full_and_timeout():
+    admission = make_admission(queue_timeout=0.05)
+    async with admission.admit("alice"):
+        with pytest.raises(UploadRejected) as e:
+            async with admission.admit("bob"):
+                pass
+        assert e.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert e.value.detail == "Upload queue timeout"
+        admission.waiting = 1
+        with pytest.raises(UploadRejected) as e:
+            async with admission.admit("carol"):
+                pass
+        assert e.value.detail == "Upload queue is full"
+        admission.waiting = 0
+    assert admission._per_user == {}
+
+
+async def test_cancelled_wait_frees_user_slot():
+    admission = make_admission()
+    async with admission.admit("alice"):
+
+        async def queued():
+            async with admission.admit("alice"):
+                pass
+
+        task = asyncio.create_task(queued())
+        await asyncio.sleep(0.01)
+        assert admission.waiting == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert admission.waiting == 0
+        assert admission._per_user == {"alice": 1}
+    assert admission._per_user == {}
+
+
+async def test_queue_depth_metric(monkeypatch):
+    monkeypatch.setattr(upload_admission, "_slots", asyncio.Semaphore(1))
+
+    async def queued():
+        async with upload_admission.admit("bob"):
+            pass
+
+    async with upload_admission.admit("alice"):
+        task = asyncio.create_task(queued())
+        await asyncio.sleep(0.01)
+        assert metrics.collect()["upload_queue_depth"] == 1
+        assert metrics.collect()["upload_active"] == 1
+    await task
+    assert metrics.collect()["upload_queue_depth"] == 0
+
+
+async def test_rejected_upload_gets_retry_after(monkeypatch):
+    async def plenty():
+        return 1024**4
+
+    monkeypatch.setattr(volume_set, "max_free_space", plenty)
+    admission = make_admission(max_per_user=0)
+    app = UploadAdmissionMiddleware(accept_upload, admission)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/api/v1/files/upload", headers=auth_headers("alice")
+        )
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["Retry-After"] == str(
+        app_settings.upload_retry_after
+    )
+
+
+async def test_missing_storage_rejected(monkeypatch):
+    async def missing():
+        raise FileNotFoundError
+
+    monkeypatch.setattr(volume_set, "max_free_space", missing)
+    app = UploadAdmissionMiddleware(accept_upload, make_admission())
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/api/v1/files/upload")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json() == {"detail": "Storage is unavailable"}
+    assert "Retry-After" in response.headers
@@ -0,0 +1,76 @@
+from uuid import uuid4
+
+import pytest
+
+from core.config import app_settings
+from core.metrics import metrics
+from services.cache import ContentCache, content_cache
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ContentCache(budget=10, max_object_size=10)
+    first, second, third = uuid4(), uuid4(), uuid4()
+    cache.put(first, 1, b"aaaa")
+    cache.put(second, 1, b"bbbb")
+    assert cache.get(first, 1) == b"aaaa"
+    cache.put(third, 1, b"cccc")
+    assert cache.get(second, 1) is None
+    assert cache.get(first, 1) == b"aaaa"
+    assert cache.get(third, 1) == b"cccc"
+    assert cache.size == 8
+    assert len(cache) == 2
+
+
+def test_cache_stays_within_budget():
+    cache = ContentCache(budget=10, max_object_size=10)
+    for _ in range(5):
+        cache.put(uuid4(), 1, b"abc")
+        assert cache.size <= 10
+    assert len(cache) == 3
+    cache.put(uuid4(), 1, b"0123456789")
+    assert cache.size == 10
+    assert len(cache) == 1
+
+
+def test_cache_rejects_large_entries(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(app_settings, "content_cache_enabled", True)
+    cache = ContentCache(budget=100, max_object_size=4)
+    file_id = uuid4()
+    cache.put(file_id, 1, b"12345")
+    assert cache.get(file_id, 1) is None
+    assert cache.size == 0
+    assert cache.accepts(4)
+    assert not cache.accepts(5)
+    monkeypatch.setattr(app_settings, "content_cache_enabled", False)
+    assert not cache.accepts(4)
+
+
+def test_cache_invalidated_by_version():
+    cache = ContentCache(budget=100, max_object_size=100)
+    file_id = uuid4()
+    cache.put(file_id, 1, b"old")
+    assert cache.get(file_id, 2) is None
+    cache.put(file_id, 2, b"new!")
+    assert cache.get(file_id, 1) is None
+    assert cache.get(file_id, 2) == b"new!"
+    assert cache.size == 4
+    cache.invalidate(file_id)
+    assert cache.get(file_id, 2) is None
+    assert cache.size == 0
+    assert len(cache) == 0
+
+
+def test_cache_hit_ratio(monkeypatch: pytest.MonkeyPatch):
+    cache = ContentCache(budget=100, max_object_size=100)
+    assert cache.hit_ratio == 0.0
+    file_id = uuid4()
+    cache.get(file_id, 1)
+    cache.put(file_id, 1, b"data")
+    cache.get(file_id, 1)
+    cache.get(file_id, 1)
+    cache.get(file_id, 1)
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert cache.hit_ratio == 0.75
+    monkeypatch.setattr(content_cache, "hits", 1)
+    monkeypatch.setattr(content_cache, "misses", 3)
+    assert metrics.collect()["content_cache_hit_ratio"] == 0.25
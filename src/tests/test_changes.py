@@ -0,0 +1,18 @@
+from services.changes import CHANGES_CHANNEL, ChangeNotifier
+
+
+def test_notification_wakes_only_its_user():
+    notifier = ChangeNotifier()
+    alice = notifier.listen(1)
+    bob = notifier.listen(2)
+    notifier._on_notification(None, 0, CHANGES_CHANNEL, "1")
+    assert alice.is_set()
+    assert not bob.is_set()
+    assert notifier.listen(1) is not alice
+
+
+def test_notify_all_wakes_every_listener():
+    notifier = ChangeNotifier()
+    events = [notifier.listen(user_id) for user_id in (1, 2, 3)]
+    notifier.notify_all()
+    assert all(event.is_set() for event in events)
@@ -0,0 +1,21 @@
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from api.v1.errors import ERROR_RESPONSES, add_error_handlers
+
+
+@pytest.mark.parametrize("error", list(ERROR_RESPONSES))
+async def test_service_errors_mapped(error):
+    app = FastAPI()
+    add_error_handlers(app)
+
+    @app.get("/fail")
+    async def fail():
+        raise error
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/fail")
+    status_code, detail = ERROR_RESPONSES[error]
+    assert response.status_code == status_code
+    assert response.json() == {"detail": detail}
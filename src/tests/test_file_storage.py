@@ -1,10 +1,24 @@
+import asyncio
+import base64
+import hashlib
+import json
 import os
 from pathlib import Path
 
+import pytest
 from fastapi import status
 from httpx import AsyncClient
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import app_settings
+from models.file_model import File as FileModel
+from services.file_storage_crud import file_crud
+from services.io_engine import io_engine
+from services.scrubber import scrubber
+from services.tiering import tier_store
+from services.volumes import volume_set
+
 
 async def test_add_user(
     async_client: AsyncClient,
@@ -143,3 +157,759 @@ async def test_increasing_count_after_upload_file(
 
     os.remove(static_path)
     assert os.path.exists(static_path) is False
+
+
+async def test_upload_file_too_large(
+    async_client: AsyncClient,
+    prefix_file_url: str,
+    test_file: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(app_settings, "upload_max_body_size", 10)
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path=my_folder",
+            files={"in_file": open_file},
+        )
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+async def test_search_file(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+):
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    path_value = "/homework/test-folder/notes.txt"
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path={path_value}",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    file_id = response.json()["id"]
+    response = await async_client.get(
+        f"{prefix_file_url}/search?query=test-fold", headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    json_response = response.json()
+    assert len(json_response["files"]) == 1
+    assert json_response["files"][0]["path"] == path_value
+    response = await async_client.get(
+        f"{prefix_file_url}/search?query=missing", headers=headers
+    )
+    assert response.json()["files"] == []
+
+    os.remove(f"static/{file_id}")
+
+
+async def test_usage_after_upload_file(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+):
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    path_value = "/homework/notes.txt"
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path={path_value}",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    json_response = response.json()
+    file_id = json_response["id"]
+    file_size = json_response["size"]
+    for folder in ("", "/homework"):
+        response = await async_client.get(
+            f"{prefix_file_url}/usage?path={folder}", headers=headers
+        )
+        assert response.status_code == status.HTTP_200_OK
+        json_response = response.json()
+        assert json_response["size"] == file_size
+        assert json_response["files"] == 1
+    response = await async_client.get(
+        f"{prefix_file_url}/usage?path=/other", headers=headers
+    )
+    assert response.json()["files"] == 0
+
+    os.remove(f"static/{file_id}")
+
+
+async def test_upload_batch(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+):
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    content = test_file.read_bytes()
+    files = [
+        ("in_files", ("first.txt", content)),
+        ("in_files", ("second.txt", content)),
+        ("in_files", ("first.txt", content)),
+    ]
+    response = await async_client.post(
+        f"{prefix_file_url}/upload/batch?path=my_folder",
+        headers=headers,
+        files=files,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    json_response = response.json()
+    assert [result["created"] for result in json_response["files"]] == [
+        True,
+        True,
+        False,
+    ]
+    assert json_response["files"][1]["path"] == "my_folder/second.txt"
+    response = await async_client.get(prefix_file_url, headers=headers)
+    assert len(response.json()["files"]) == 2
+
+    for result in json_response["files"][:2]:
+        os.remove(f"static/{result['file']['id']}")
+
+
+async def test_bulk_copy_move_delete(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+):
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path=/a/notes.txt",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    file_id = response.json()["id"]
+    response = await async_client.post(
+        f"{prefix_file_url}/bulk/copy",
+        headers=headers,
+        json={"source": "/a", "destination": "/b"},
+    )
+    assert response.json()["count"] == 1
+    response = await async_client.post(
+        f"{prefix_file_url}/bulk/move",
+        headers=headers,
+        json={"source": "/b/", "destination": "/c/"},
+    )
+    assert response.json()["count"] == 1
+    response = await async_client.post(
+        f"{prefix_file_url}/bulk/delete", headers=headers, json={"path": "/a"}
+    )
+    assert response.json()["count"] == 1
+    assert os.path.exists(f"static/{file_id}") is False
+    response = await async_client.get(prefix_file_url, headers=headers)
+    files = response.json()["files"]
+    assert [file["path"] for file in files] == ["/c/notes.txt"]
+
+    os.remove(f"static/{files[0]['id']}")
+
+
+async def test_download_small_file_from_segment(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(app_settings, "segment_storage_enabled", True)
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    path_value = "my_folder"
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path={path_value}",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    file_id = response.json()["id"]
+    assert os.path.exists(f"static/{file_id}") is False
+    response = await async_client.get(
+        f"{prefix_file_url}/download?path={path_value}", headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == test_file.read_bytes()
+
+
+async def test_changes_feed(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+):
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path=/a/notes.txt",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    file_id = response.json()["id"]
+    response = await async_client.get(
+        f"{prefix_file_url}/changes?since=0", headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    json_response = response.json()
+    assert [change["action"] for change in json_response["changes"]] == [
+        "created"
+    ]
+    cursor = json_response["cursor"]
+    await async_client.post(
+        f"{prefix_file_url}/bulk/move",
+        headers=headers,
+        json={"source": "/a", "destination": "/b"},
+    )
+    response = await async_client.get(
+        f"{prefix_file_url}/changes?since={cursor}", headers=headers
+    )
+    changes = response.json()["changes"]
+    assert len(changes) == 1
+    assert changes[0]["action"] == "moved"
+    assert changes[0]["old_path"] == "/a/notes.txt"
+    assert changes[0]["path"] == "/b/notes.txt"
+
+    os.remove(f"static/{file_id}")
+
+
+async def test_upload_precheck(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+):
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    content = test_file.read_bytes()
+    precheck = {
+        "path": "copy.txt",
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "size": len(content),
+    }
+    response = await async_client.post(
+        f"{prefix_file_url}/upload/precheck", headers=headers, json=precheck
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["exists"] is False
+    assert (
+        "/api/v1/files/upload?path=copy.txt" in response.json()["upload_url"]
+    )
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path=original.txt",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    assert response.json()["sha256"] == precheck["sha256"]
+    original_id = response.json()["id"]
+    response = await async_client.post(
+        f"{prefix_file_url}/upload/precheck", headers=headers, json=precheck
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    json_response = response.json()
+    assert json_response["exists"] is True
+    assert json_response["file"]["path"] == "copy.txt"
+    copy_id = json_response["file"]["id"]
+    response = await async_client.get(
+        f"{prefix_file_url}/download?path=copy.txt", headers=headers
+    )
+    assert response.content == content
+
+    os.remove(f"static/{original_id}")
+    os.remove(f"static/{copy_id}")
+
+
+async def test_upload_delta(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+):
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    path_value = "my_folder"
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path={path_value}",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    file_id = response.json()["id"]
+    response = await async_client.get(
+        f"{prefix_file_url}/signatures?path={path_value}&block_size=1024",
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    signatures = response.json()
+    assert signatures["version"] == 1
+    assert len(signatures["blocks"]) > 0
+    instructions = [{"block": 0}, {"offset": 0, "length": 4}]
+    response = await async_client.post(
+        f"{prefix_file_url}/upload/delta?path={path_value}"
+        f"&block_size=1024&version=1",
+        headers=headers,
+        data={"instructions": json.dumps(instructions)},
+        files={"data": ("data", b"tail")},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["version"] == 2
+    expected = test_file.read_bytes()[:1024] + b"tail"
+    response = await async_client.get(
+        f"{prefix_file_url}/download?path={path_value}", headers=headers
+    )
+    assert response.content == expected
+    response = await async_client.post(
+        f"{prefix_file_url}/upload/delta?path={path_value}"
+        f"&block_size=1024&version=1",
+        headers=headers,
+        data={"instructions": json.dumps(instructions)},
+        files={"data": ("data", b"tail")},
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    os.remove(f"static/{file_id}")
+
+
+async def test_cold_file_promoted_on_download(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(app_settings, "tier_cold_after", -60.0)
+    monkeypatch.setattr(app_settings, "tier_grace", 0.0)
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    path_value = "my_folder"
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path={path_value}",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    file_id = response.json()["id"]
+    async with async_session() as db:
+        await tier_store.demote(db)
+    assert os.path.exists(f"static/{file_id}") is False
+    assert os.path.exists(tier_store.cold_path(file_id)) is True
+    response = await async_client.get(
+        f"{prefix_file_url}/download?path={path_value}", headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == test_file.read_bytes()
+    assert os.path.exists(f"static/{file_id}") is True
+    assert os.path.exists(tier_store.cold_path(file_id)) is False
+
+    os.remove(f"static/{file_id}")
+
+
+async def test_upload_to_volumes_and_rebalance(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    folders = {"a": str(tmp_path / "a"), "b": str(tmp_path / "b")}
+    for folder in folders.values():
+        os.makedirs(folder)
+    monkeypatch.setattr(volume_set, "folders", folders)
+    monkeypatch.setattr(volume_set, "draining", {"b"})
+    monkeypatch.setattr(app_settings, "storage_rebalance_grace", 0.0)
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    path_value = "my_folder"
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path={path_value}",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    file_id = response.json()["id"]
+    assert os.path.exists(tmp_path / "a" / file_id) is True
+    assert os.path.exists(f"static/{file_id}") is False
+
+    monkeypatch.setattr(volume_set, "draining", {"a"})
+    async with async_session() as db:
+        await volume_set.rebalance(db)
+    assert os.path.exists(tmp_path / "a" / file_id) is False
+    assert os.path.exists(tmp_path / "b" / file_id) is True
+    response = await async_client.get(
+        f"{prefix_file_url}/download?path={path_value}", headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == test_file.read_bytes()
+
+
+async def test_upload_with_group_commit(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(app_settings, "group_commit_enabled", True)
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def upload(path: str):
+        with open(test_file, "rb") as open_file:
+            return await async_client.post(
+                f"{prefix_file_url}/upload?path={path}",
+                headers=headers,
+                files={"in_file": open_file},
+            )
+
+    responses = await asyncio.gather(
+        *[upload(f"group/{number}.txt") for number in range(5)]
+    )
+    assert [response.status_code for response in responses] == [
+        status.HTTP_201_CREATED
+    ] * 5
+    response = await async_client.get(f"{prefix_file_url}", headers=headers)
+    assert len(response.json()["files"]) == 5
+
+    for response in responses:
+        os.remove(f"static/{response.json()['id']}")
+
+
+async def test_append_and_write_at_offset(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+):
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    path_value = "my_folder"
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path={path_value}",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    file_id = response.json()["id"]
+    content = test_file.read_bytes()
+    response = await async_client.patch(
+        f"{prefix_file_url}/upload?path={path_value}",
+        headers={**headers, "If-Match": '"1"'},
+        content=b"tail",
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] == '"2"'
+    assert response.json()["size"] == len(content) + 4
+    response = await async_client.patch(
+        f"{prefix_file_url}/upload?path={path_value}",
+        headers={**headers, "If-Match": '"1"'},
+        content=b"tail",
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    response = await async_client.patch(
+        f"{prefix_file_url}/upload?path={path_value}&offset=0",
+        headers=headers,
+        content=b"XY",
+    )
+    assert response.status_code == status.HTTP_200_OK
+    response = await async_client.patch(
+        f"{prefix_file_url}/upload?path={path_value}&offset=1000",
+        headers=headers,
+        content=b"XY",
+    )
+    assert response.status_code == (
+        status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    )
+    response = await async_client.get(
+        f"{prefix_file_url}/download?path={path_value}", headers=headers
+    )
+    assert response.content == b"XY" + content[2:] + b"tail"
+    assert response.headers["ETag"] == '"3"'
+
+    os.remove(f"static/{file_id}")
+
+
+async def test_upload_and_download_in_buffers(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(io_engine, "buffer_size", 4096)
+    monkeypatch.setattr(io_engine, "dontneed_size", 0)
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    content = os.urandom(3 * 4096 + 17)
+    response = await async_client.post(
+        f"{prefix_file_url}/upload?path=buffers/data.bin",
+        headers=headers,
+        files={"in_file": ("data.bin", content)},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    file_id = response.json()["id"]
+    assert os.path.getsize(f"static/{file_id}") == len(content)
+    response = await async_client.get(
+        f"{prefix_file_url}/download?path=buffers/data.bin", headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Length"] == str(len(content))
+    assert response.content == content
+
+    os.remove(f"static/{file_id}")
+
+
+async def test_expired_files_hidden_and_swept(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+):
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def upload(path: str, expires_in: int):
+        with open(test_file, "rb") as open_file:
+            return await async_client.post(
+                f"{prefix_file_url}/upload?path={path}"
+                f"&expires_in={expires_in}",
+                headers=headers,
+                files={"in_file": open_file},
+            )
+
+    responses = [await upload(f"tmp/{number}.txt", 1) for number in range(2)]
+    assert responses[0].json()["expires_at"] is not None
+    file_ids = [response.json()["id"] for response in responses]
+    await asyncio.sleep(1.1)
+    response = await async_client.get(f"{prefix_file_url}", headers=headers)
+    assert response.json()["files"] == []
+    response = await async_client.get(
+        f"{prefix_file_url}/download?path=tmp/0.txt", headers=headers
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    # the expired row holding the path is purged by the new upload
+    response = await upload("tmp/0.txt", 3600)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert not os.path.exists(f"static/{file_ids[0]}")
+    async with async_session() as db:
+        await file_crud.sweep_expired(db)
+    assert not os.path.exists(f"static/{file_ids[1]}")
+    response = await async_client.get(f"{prefix_file_url}", headers=headers)
+    assert len(response.json()["files"]) == 1
+
+    os.remove(f"static/{response.json()['files'][0]['id']}")
+
+
+async def test_upload_digest_verified_and_scrubbed(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+):
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    content = test_file.read_bytes()
+    md5 = base64.b64encode(hashlib.md5(content).digest()).decode()
+    sha256 = base64.b64encode(hashlib.sha256(content).digest()).decode()
+
+    async def upload(path: str, digest_headers: dict):
+        with open(test_file, "rb") as open_file:
+            return await async_client.post(
+                f"{prefix_file_url}/upload?path={path}",
+                headers={**headers, **digest_headers},
+                files={"in_file": open_file},
+            )
+
+    response = await upload("digest/good.txt", {"Content-MD5": md5})
+    assert response.status_code == status.HTTP_201_CREATED
+    file_id = response.json()["id"]
+    other_md5 = base64.b64encode(hashlib.md5(b"other").digest()).decode()
+    blobs = set(os.listdir("static"))
+    response = await upload("digest/bad.txt", {"Content-MD5": other_md5})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "Content does not match the digest"
+    assert set(os.listdir("static")) == blobs
+    response = await upload("digest/bad.txt", {"Content-MD5": "not base64"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "Invalid digest header"
+    response = await async_client.get(
+        f"{prefix_file_url}/download?path=digest/good.txt", headers=headers
+    )
+    assert response.headers["Content-Digest"] == f"sha-256=:{sha256}:"
+    async with async_session() as db:
+        await scrubber.scrub(db)
+    assert scrubber.verified >= 1
+    assert scrubber.corrupted == 0
+    with open(f"static/{file_id}", "r+b") as open_file:
+        open_file.write(b"!")
+    async with async_session() as db:
+        await db.execute(
+            update(FileModel)
+            .where(FileModel.id == file_id)
+            .values(verified_at=None)
+        )
+        await db.commit()
+        await scrubber.scrub(db)
+        file_obj = await db.get(FileModel, file_id)
+    assert scrubber.corrupted == 1
+    assert file_obj.corrupted_at is not None
+    assert file_obj.verified_at is None
+    async with async_session() as db:
+        await scrubber.scrub(db)
+    assert scrubber.corrupted == 1
+
+    os.remove(f"static/{file_id}")
+
+
+async def test_bulk_root_path_rejected_and_copy_quota(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    user_test_data: dict,
+    prefix_user_url: str,
+    prefix_file_url: str,
+    test_file: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    size = test_file.stat().st_size
+    monkeypatch.setattr(app_settings, "default_user_quota", size + size // 2)
+    await async_client.post(f"{prefix_user_url}/register", json=user_test_data)
+    response = await async_client.post(
+        f"{prefix_user_url}/auth", json=user_test_data
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    with open(test_file, "rb") as open_file:
+        response = await async_client.post(
+            f"{prefix_file_url}/upload?path=quota/file.txt",
+            headers=headers,
+            files={"in_file": open_file},
+        )
+    file_id = response.json()["id"]
+    for path in ("", "/"):
+        response = await async_client.post(
+            f"{prefix_file_url}/bulk/delete",
+            headers=headers,
+            json={"path": path},
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = await async_client.post(
+            f"{prefix_file_url}/bulk/move",
+            headers=headers,
+            json={"source": path, "destination": "moved"},
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        for action in ("move", "copy"):
+            response = await async_client.post(
+                f"{prefix_file_url}/bulk/{action}",
+                headers=headers,
+                json={"source": "quota", "destination": path},
+            )
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+    blobs = set(os.listdir("static"))
+    response = await async_client.post(
+        f"{prefix_file_url}/bulk/copy",
+        headers=headers,
+        json={"source": "quota", "destination": "copy"},
+    )
+    assert response.status_code == status.HTTP_507_INSUFFICIENT_STORAGE
+    response = await async_client.get(f"{prefix_file_url}", headers=headers)
+    assert [file["id"] for file in response.json()["files"]] == [file_id]
+    assert set(os.listdir("static")) == blobs
+
+    os.remove(f"static/{file_id}")
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import time
+
+from starlette.types import Receive, Scope, Send
+
+from services.profiling import (ProfilingMiddleware, RequestProfile,
+                                active_profile, prune_profiles,
+                                sign_profile_request)
+
+SECRET = "profiling-secret"
+
+
+async def plain_app(scope: Scope, receive: Receive, send: Send) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/plain")],
+        }
+    )
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def make_scope(path: str, header: str | None = None) -> Scope:
+    headers = [] if header is None else [(b"x-profile", header.encode())]
+    return {"type": "http", "method": "GET", "path": path, "headers": headers}
+
+
+def test_signed_profile_requests(tmp_path):
+    middleware = ProfilingMiddleware(plain_app, SECRET, folder=str(tmp_path))
+    expires = int(time.time()) + 60
+    header = sign_profile_request(SECRET, "/api/v1/files", expires)
+    assert middleware._is_signed(make_scope("/api/v1/files", header))
+    assert not middleware._is_signed(make_scope("/api/v1/other", header))
+    bad = sign_profile_request("other-secret", "/api/v1/files", expires)
+    assert not middleware._is_signed(make_scope("/api/v1/files", bad))
+    expired = sign_profile_request(
+        SECRET, "/api/v1/files", int(time.time()) - 1
+    )
+    assert not middleware._is_signed(make_scope("/api/v1/files", expired))
+    assert not middleware._is_signed(make_scope("/api/v1/files"))
+
+
+async def test_profiled_request_writes_profile(tmp_path):
+    middleware = ProfilingMiddleware(plain_app, SECRET, folder=str(tmp_path))
+    header = sign_profile_request(SECRET, "/ping", int(time.time()) + 60)
+    messages = []
+
+    async def send(message) -> None:
+        messages.append(message)
+
+    await middleware(make_scope("/ping", header), None, send)
+    profile_id = dict(messages[0]["headers"])[b"x-profile-id"].decode()
+    report = json.loads((tmp_path / f"{profile_id}.json").read_text())
+    assert report["path"] == "/ping"
+    assert report["status_code"] == 200
+    assert report["functions"]
+    assert (tmp_path / f"{profile_id}.prof").exists()
+
+
+def test_prune_profiles_keeps_newest(tmp_path):
+    for number in range(5):
+        for suffix in (".json", ".prof"):
+            (tmp_path / f"2026010{number}T000000-id{suffix}").write_text("")
+    prune_profiles(str(tmp_path), 2)
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "20260103T000000-id.json",
+        "20260103T000000-id.prof",
+        "20260104T000000-id.json",
+        "20260104T000000-id.prof",
+    ]
+
+
+async def test_queries_attributed_to_own_request(tmp_path):
+    middleware = ProfilingMiddleware(plain_app, SECRET, folder=str(tmp_path))
+    profile = RequestProfile(make_scope("/ping"))
+
+    class Connection:
+        def __init__(self):
+            self.info = {}
+
+    def run_query(statement: str) -> None:
+        conn = Connection()
+        middleware._before_query(conn, None, statement)
+        middleware._after_query(conn, None, statement)
+
+    async def profiled() -> None:
+        active_profile.set(profile)
+        run_query("SELECT 1")
+
+    async def other() -> None:
+        run_query("SELECT 2")
+
+    await asyncio.gather(
+        asyncio.create_task(profiled()), asyncio.create_task(other())
+    )
+    assert [query["statement"] for query in profile.queries] == ["SELECT 1"]
+    assert active_profile.get() is None
@@ -0,0 +1,41 @@
+import os
+import time
+
+from core.config import app_settings
+from services.segments import SegmentStore
+
+
+def make_store(tmp_path, *segments):
+    store = SegmentStore(str(tmp_path), max_blob_size=4096, max_size=1024)
+    for segment in segments:
+        with open(store.segment_path(segment), "wb") as segment_file:
+            segment_file.write(b"data")
+    return store
+
+
+def age_marker(store, segment, seconds):
+    path = os.path.join(store.folder, "retired", segment)
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_retired_segment_kept_during_grace(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_settings, "segment_compaction_grace", 60.0)
+    store = make_store(tmp_path, "old")
+    store.retire("old")
+    assert store.purge_retired({}) == {"old"}
+    assert os.path.exists(store.segment_path("old"))
+    age_marker(store, "old", 120)
+    assert store.purge_retired({}) == {"old"}
+    assert not os.path.exists(store.segment_path("old"))
+    assert store.purge_retired({}) == set()
+
+
+def test_retired_segment_with_rows_not_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_settings, "segment_compaction_grace", 60.0)
+    store = make_store(tmp_path, "old")
+    store.retire("old")
+    age_marker(store, "old", 120)
+    store.purge_retired({"old": 4})
+    assert os.path.exists(store.segment_path("old"))
+    assert "retired" not in store.list_segments()
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from core.config import app_settings
+from db.database import pool_limits
+from server import worker_count
+
+
+def test_worker_count_explicit(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(app_settings, "server_workers", 3)
+    assert worker_count() == 3
+
+
+def test_worker_count_from_affinity(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(app_settings, "server_workers", 0)
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: {0, 2}, False)
+    assert worker_count() == 2
+
+
+def test_worker_count_from_cpu_count(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(app_settings, "server_workers", 0)
+    monkeypatch.delattr(os, "sched_getaffinity", raising=False)
+    monkeypatch.setattr(os, "cpu_count", lambda: 6)
+    assert worker_count() == 6
+
+
+def test_pool_limits_split_budget(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(app_settings, "database_pool_size", 10)
+    monkeypatch.setattr(app_settings, "database_max_overflow", 10)
+    monkeypatch.setattr(app_settings, "database_max_connections", 90)
+    assert pool_limits(4) == (10, 10)
+    assert pool_limits(6) == (10, 4)
+    assert pool_limits(16) == (4, 0)
+    assert pool_limits(45) == (1, 0)
+    with pytest.raises(RuntimeError):
+        pool_limits(46)
+    monkeypatch.setattr(app_settings, "database_max_connections", 0)
+    assert pool_limits(91) == (10, 10)
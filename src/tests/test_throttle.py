@@ -0,0 +1,56 @@
+from time import monotonic
+
+from services.throttle import DownloadThrottle, TokenBucket
+
+
+async def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=10000, burst=1000)
+    start = monotonic()
+    await bucket.consume(1000)
+    assert monotonic() - start < 0.05
+    await bucket.consume(1000)
+    assert monotonic() - start >= 0.09
+
+
+async def test_token_bucket_caps_refill_at_burst():
+    bucket = TokenBucket(rate=10000, burst=1000)
+    await bucket.consume(1000)
+    bucket._updated -= 10
+    assert bucket.is_full()
+    start = monotonic()
+    await bucket.consume(1000)
+    await bucket.consume(500)
+    assert monotonic() - start >= 0.04
+
+
+async def test_user_bucket_kept_between_streams():
+    throttle = DownloadThrottle(rate=0, user_rate=1000)
+    async with throttle.stream(1) as buckets:
+        await buckets[0].consume(1000)
+    async with throttle.stream(1) as buckets:
+        assert buckets[0].is_full() is False
+    async with throttle.stream(2) as other_buckets:
+        assert other_buckets[0] is not buckets[0]
+        assert other_buckets[0].is_full()
+
+
+async def test_refilled_idle_bucket_evicted():
+    throttle = DownloadThrottle(rate=0, user_rate=1000)
+    async with throttle.stream(1) as buckets:
+        await buckets[0].consume(1000)
+    buckets[0]._updated -= 10
+    async with throttle.stream(2):
+        assert list(throttle._users) == [2]
+
+
+async def test_streams_share_global_and_user_budget():
+    throttle = DownloadThrottle(rate=2000, user_rate=1000)
+    async with throttle.stream(1) as first, throttle.stream(1) as second:
+        assert first[0] is second[0]
+        assert first[1] is second[1]
+        assert throttle.active_streams == 2
+    async with throttle.stream(2) as other:
+        assert other[0] is not first[0]
+        assert other[1] is first[1]
+    assert throttle.active_streams == 0
+    assert throttle._streams == {}
@@ -0,0 +1,35 @@
+import shutil
+from collections import namedtuple
+
+from core.config import app_settings
+from services.volumes import VolumeSet
+
+Usage = namedtuple("Usage", "total used free")
+
+
+async def test_free_space_cached_for_ttl(tmp_path, monkeypatch):
+    calls = []
+
+    def disk_usage(folder):
+        calls.append(folder)
+        return Usage(100, 100 - len(calls), len(calls))
+
+    monkeypatch.setattr(shutil, "disk_usage", disk_usage)
+    monkeypatch.setattr(app_settings, "storage_free_space_ttl", 60.0)
+    volumes = VolumeSet(str(tmp_path), {"a": str(tmp_path / "a")}, [])
+    assert await volumes.max_free_space() == 1
+    assert await volumes.choose() == "a"
+    assert len(calls) == 1
+    monkeypatch.setattr(app_settings, "storage_free_space_ttl", 0.0)
+    assert await volumes.max_free_space() == 2
+
+
+async def test_choose_skips_draining_and_excluded(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        shutil, "disk_usage", lambda folder: Usage(100, 50, 50)
+    )
+    folders = {name: str(tmp_path / name) for name in ("a", "b", "c")}
+    volumes = VolumeSet(str(tmp_path), folders, ["c"])
+    assert await volumes.choose(exclude="a") == "b"
+    assert await volumes.choose(exclude="b") == "a"
+    assert await VolumeSet(str(tmp_path), {}, []).choose() is None